@@ -0,0 +1,131 @@
+import os
+import time
+import bisect
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from noter_gpt.manifest import RACY_WINDOW_NS
+
+
+def is_hidden(name: str) -> bool:
+    return name[0] == "."
+
+
+def is_note(name: str) -> bool:
+    return not is_hidden(name) and name.endswith(".txt")
+
+
+class NoteInfo(NamedTuple):
+    size: int
+    mtime_ns: int
+
+
+class DirectoryScan(NamedTuple):
+    mtime_ns: Optional[int]  # None while too recent to be trusted
+    notes: Dict[str, NoteInfo]  # relative path -> info
+    directories: List[str]  # relative paths of subdirectories
+
+
+class NoteCatalog:
+    """Every note under the root, rescanned one directory at a time
+
+    Adding, removing or renaming an entry changes the mtime of the directory
+    holding it, so a listing stats every known directory and only rescans
+    the ones whose mtime differs from the last scan. Listing an unchanged
+    notebook costs one stat per directory and no reads.
+
+    Sizes and mtimes of notes are the ones seen when their directory was last
+    scanned. Writing to a note in place does not touch its directory, so
+    callers that need fresh ones must stat the note.
+    """
+
+    def __init__(self, root_path: str):
+        self.root_path = root_path
+        self.scans: Dict[str, DirectoryScan] = {}  # "" is the root
+        self.sorted_notes: List[str] = []
+        self.infos: Dict[str, NoteInfo] = {}
+        self._lock = threading.Lock()
+
+    def notes(self) -> List[str]:
+        """Relative paths of all notes, sorted"""
+        with self._lock:
+            self._refresh()
+            return list(self.sorted_notes)
+
+    def info(self) -> Dict[str, NoteInfo]:
+        """Size and mtime of every note, by relative path"""
+        with self._lock:
+            self._refresh()
+            return dict(self.infos)
+
+    def page(
+        self, prefix: str = "", after: str = None, limit: int = 100
+    ) -> Tuple[List[Tuple[str, NoteInfo]], bool]:
+        """Up to `limit` notes starting with `prefix` that sort after `after`
+
+        Also returns whether more notes follow. Paths are unique and sorted,
+        so the last path of a page is the cursor for the next one.
+        """
+        with self._lock:
+            self._refresh()
+            if after is not None and after >= prefix:
+                start = bisect.bisect_right(self.sorted_notes, after)
+            else:
+                start = bisect.bisect_left(self.sorted_notes, prefix)
+            page = []
+            for note in self.sorted_notes[start : start + limit + 1]:
+                if not note.startswith(prefix):
+                    break
+                page.append((note, self.infos[note]))
+            return page[:limit], len(page) > limit
+
+    def _refresh(self) -> None:
+        changed = False
+        visited = set()
+        # parents go first, so removed directories are dropped before a visit
+        pending = [""]
+        while pending:
+            directory = pending.pop()
+            try:
+                mtime_ns = os.stat(os.path.join(self.root_path, directory)).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            visited.add(directory)
+            scan = self.scans.get(directory)
+            if scan is None or scan.mtime_ns != mtime_ns:
+                scan = self._scan(directory, mtime_ns)
+                self.scans[directory] = scan
+                changed = True
+            pending.extend(scan.directories)
+
+        for directory in self.scans.keys() - visited:
+            del self.scans[directory]
+            changed = True
+        if changed:
+            self.infos = {
+                note: info
+                for scan in self.scans.values()
+                for note, info in scan.notes.items()
+            }
+            self.sorted_notes = sorted(self.infos)
+
+    def _scan(self, directory: str, mtime_ns: int) -> DirectoryScan:
+        notes = {}
+        directories = []
+        with os.scandir(os.path.join(self.root_path, directory)) as entries:
+            for entry in entries:
+                path = os.path.join(directory, entry.name)
+                if entry.is_dir():
+                    # like os.walk, symlinked directories are not followed
+                    if not is_hidden(entry.name) and not entry.is_symlink():
+                        directories.append(path)
+                elif is_note(entry.name):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    notes[path] = NoteInfo(stat.st_size, stat.st_mtime_ns)
+        # an entry added in the same tick as the scan would leave mtime as is
+        if time.time_ns() - mtime_ns < RACY_WINDOW_NS:
+            mtime_ns = None
+        return DirectoryScan(mtime_ns, notes, directories)
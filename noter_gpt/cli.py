@@ -1,9 +1,16 @@
+import json
 import argparse
 from typing import List, Tuple, Iterator
 
-from noter_gpt.database.annoy_database import AnnoyDatabase
+from noter_gpt.database.inject import inject_database
+from noter_gpt.embedder.inject import inject_embedder
 from noter_gpt.summarizer.inject import inject_summarizer
-from noter_gpt.summarizer.batch_summarizer import BatchSummarizer
+from noter_gpt.summarizer.batch_summarizer import (
+    API_NOTES_PER_BATCH,
+    BatchSummarizer,
+)
+from noter_gpt.summarizer.cache import SummaryCache
+from noter_gpt.summarizer.process_pool_summarizer import ProcessPoolSummarizer
 from noter_gpt.storage import Storage
 from noter_gpt.server import run_server
 
@@ -11,7 +18,7 @@ from noter_gpt.server import run_server
 def search_documents(
     query_file: str, n: int, storage: Storage
 ) -> List[Tuple[str, float]]:
-    database = AnnoyDatabase(storage=storage)
+    database = inject_database(storage=storage, embedder=inject_embedder())
     database.build_or_update_index()
     return database.find_similar_to_file(query_file, n)
 
@@ -32,10 +39,24 @@ def stream_summarize_document(
     return summarizer.stream_summarize_file(file_path)
 
 
-def summarize_all(storage: Storage, use_openai: bool) -> None:
+def summarize_all(storage: Storage, use_openai: bool, processes: int = None) -> None:
+    if processes and use_openai:
+        raise ValueError("processes only apply to local models, not to OpenAI")
+    if processes:
+        return ProcessPoolSummarizer(
+            storage=storage, processes=processes
+        ).summarize_all_notes()
     summarizer = inject_summarizer(storage=storage, use_openai=use_openai)
     batch_summarizer = BatchSummarizer(summarizer, storage=storage)
-    return batch_summarizer.parallel_summarize_all_notes()
+    if use_openai:
+        # requests run concurrently within the summarizer's rate limits
+        return batch_summarizer.summarize_all_notes(notes_per_batch=API_NOTES_PER_BATCH)
+    # local models batch chunks of many notes instead of sharing threads
+    return batch_summarizer.summarize_all_notes()
+
+
+def summary_cache_stats(storage: Storage) -> dict:
+    return SummaryCache(storage.summary_database_file()).statistics()
 
 
 def cli():
@@ -49,6 +70,7 @@ def cli():
             "gemma_summarize",
             "mixtral_summarize",
             "summarize_all",
+            "summary_cache_stats",
             "server",
         ],
     )
@@ -68,7 +90,15 @@ def cli():
         default=False,
         help="Use OpenAI API",
     )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=None,
+        help="Worker processes for summarize_all with a local model",
+    )
     args = parser.parse_args()
+    if args.processes and args.use_openai:
+        parser.error("--processes only applies to local models, not --use-openai")
 
     storage = Storage(root_path=args.root_path, cache_path=args.cache_path)
 
@@ -94,9 +124,12 @@ def cli():
         for output in stream_summarize_document(
             args.directory_or_file, storage, use_openai=args.use_openai
         ):
-            print(output, end="")
+            print(output, end="", flush=True)
+        print()
     elif args.command == "summarize_all":
-        summarize_all(storage, use_openai=args.use_openai)
+        summarize_all(storage, use_openai=args.use_openai, processes=args.processes)
+    elif args.command == "summary_cache_stats":
+        print(json.dumps(summary_cache_stats(storage), indent=2))
     elif args.command == "server":
         run_server(use_openai=args.use_openai)
 
@@ -1,67 +1,173 @@
 import os
-from typing import List, Tuple
-from functools import cached_property
+import json
+from typing import Dict, FrozenSet, List, NamedTuple, Tuple
 
+import numpy as np
 from annoy import AnnoyIndex
 
 from noter_gpt.embedder.interface import EmbedderInterface
-from noter_gpt.embedder.transformers_embedder import TransformersEmbedder
 from noter_gpt.storage import Storage
 from noter_gpt.database.interface import VectorDatabaseInterface
+from noter_gpt.database.utils import angular_distance, normalize
+
+# changes served from the delta segment before the forest is rebuilt
+MAX_DELTA_SIZE = 256
+
+
+class AnnoySnapshot(NamedTuple):
+    """Everything a query needs, never modified once published"""
+
+    index: AnnoyIndex
+    item_paths: Tuple[str, ...]  # Path of each item id, None for unused ids
+    item_ids: Dict[str, int]
+    unused_ids: FrozenSet[int]
+    # annoy can't change items after a build, so changes since the last
+    # build hide the stale item and are searched in a small side segment
+    tombstones: FrozenSet[int]
+    delta_paths: Tuple[str, ...]
+    delta_vectors: np.ndarray  # normalized, one row per delta path
 
 
 class AnnoyDatabase(VectorDatabaseInterface):
+    """Approximate search over an annoy forest
+
+    Queries read a single immutable AnnoySnapshot. Rebuilds and updates
+    prepare a new snapshot off to the side and publish it by swapping one
+    reference, so readers never lock or see a half-built index.
+
+    Item ids are the stable rows of the embedding store, and the id to path
+    table is saved next to the index so it can be reused across restarts.
+    """
+
     def __init__(
         self,
         storage: Storage = None,
         embedder: EmbedderInterface = None,
     ):
-        super().__init__(storage=storage)
-        if not embedder:
-            self.embedder = TransformersEmbedder()
-        else:
-            self.embedder = embedder
-        self.index = AnnoyIndex(self.embedder.dimension(), "angular")
+        super().__init__(storage=storage, embedder=embedder)
         self.index_file = self.storage.built_index_file(self.embedder.identifier)
+        self.index_items_file = self.storage.built_index_items_file(
+            self.embedder.identifier
+        )
         self.item_count = 0  # Counter for the number of items in the index
-
-    def get_embedding(self, text: str) -> List[float]:
-        return self.embedder.embed_text(text).tolist()
+        self.snapshot: AnnoySnapshot = None
 
     def rebuild_index(self) -> None:
-        self.index = AnnoyIndex(self.embedder.dimension(), "angular")
-        self.item_count = 0  # Reset the counter
-        for doc in self.documents.values():
-            self.index.add_item(self.item_count, doc["embedding"])
-            self.item_count += 1  # Increment the counter for each item
-        self.index.build(20)
-        self.index.save(self.index_file)
+        index = AnnoyIndex(self.embedder.dimension(), "angular")
+        for path in self.documents:
+            index.add_item(self.documents.row(path), self.documents.vector(path))
+        index.build(20)
+        item_paths = tuple(self.documents.keys)
+        item_hashes = [
+            self.documents.hash(path) if path else None for path in item_paths
+        ]
+
+        # build next to the published files so readers keep a valid mmap
+        tmp_index_file = f"{self.index_file}.tmp"
+        index.save(tmp_index_file)
+        os.replace(tmp_index_file, self.index_file)
+        tmp_items_file = f"{self.index_items_file}.tmp"
+        with open(tmp_items_file, "w+") as f:
+            json.dump({"item_paths": item_paths, "item_hashes": item_hashes}, f)
+        os.replace(tmp_items_file, self.index_items_file)
+
+        self.item_count = len(self.documents)
+        self.snapshot = self._snapshot(index, item_paths)
         self.need_rebuild = False
 
+    def _snapshot(self, index: AnnoyIndex, item_paths: Tuple[str, ...]):
+        return AnnoySnapshot(
+            index=index,
+            item_paths=item_paths,
+            item_ids={path: i for i, path in enumerate(item_paths) if path},
+            unused_ids=frozenset(i for i, path in enumerate(item_paths) if not path),
+            tombstones=frozenset(),
+            delta_paths=(),
+            delta_vectors=np.zeros((0, self.dimension()), dtype=np.float32),
+        )
+
     def _load_documents(self) -> None:
         super()._load_documents()
-        if os.path.exists(self.index_file):
-            self.index.load(self.index_file)
+        try:
+            with open(self.index_items_file, "r") as f:
+                items = json.load(f)
+            index = AnnoyIndex(self.embedder.dimension(), "angular")
+            index.load(self.index_file)
+        except (FileNotFoundError, OSError, json.JSONDecodeError):
+            return
+        item_paths = tuple(items["item_paths"])
+        if index.get_n_items() > len(item_paths):
+            return  # saved by a build the items file doesn't describe
+
+        self.item_count = len(item_paths) - item_paths.count(None)
+        self.snapshot = self._snapshot(index, item_paths)
+        self.need_rebuild = False
+
+        # catch up with notes that changed after the index was built
+        for path, item_hash in zip(item_paths, items["item_hashes"]):
+            if path and path not in self.documents:
+                self._document_removed(path)
+            elif path and self.documents.hash(path) != item_hash:
+                self._document_updated(path)
+        for path in self.documents:
+            if path not in self.snapshot.item_ids:
+                self._document_updated(path)
+
+    def _document_updated(self, path: str) -> None:
+        self._publish_delta(path, normalize(self.documents.vector(path)))
+
+    def _document_removed(self, path: str) -> None:
+        self._publish_delta(path, None)
+
+    def _publish_delta(self, path: str, vector: np.ndarray) -> None:
+        snapshot = self.snapshot
+        if snapshot is None:
+            return  # nothing published yet, the first rebuild picks it up
+
+        tombstones = snapshot.tombstones
+        if path in snapshot.item_ids:
+            tombstones = tombstones | {snapshot.item_ids[path]}
+        keep = [i for i, p in enumerate(snapshot.delta_paths) if p != path]
+        delta_paths = tuple(snapshot.delta_paths[i] for i in keep)
+        delta_vectors = snapshot.delta_vectors[keep]
+        if vector is not None:
+            delta_paths += (path,)
+            delta_vectors = np.vstack([delta_vectors, vector])
+
+        self.snapshot = snapshot._replace(
+            tombstones=tombstones,
+            delta_paths=delta_paths,
+            delta_vectors=delta_vectors,
+        )
+        if len(tombstones) + len(delta_paths) > MAX_DELTA_SIZE:
+            self.need_rebuild = True
 
     def find_similar(self, query_text: str, n: int = 5) -> List[Tuple[str, float]]:
         if not query_text:
             return []
 
-        if self.need_rebuild:
+        snapshot = self.snapshot
+        if snapshot is None:
             self.rebuild_index()
+            snapshot = self.snapshot
 
-        query_embedding = self.embedder.embed_text(query_text)
-        indices, distances = self.index.get_nns_by_vector(
-            query_embedding, n + 1, include_distances=True
+        query_embedding = self.embedder.embed_document(query_text)
+        hidden = len(snapshot.tombstones) + len(snapshot.unused_ids)
+        indices, distances = snapshot.index.get_nns_by_vector(
+            query_embedding, n + 1 + hidden, include_distances=True
         )
-        similar_files = [
-            (list(self.documents)[i], 1 / (1 + d)) for i, d in zip(indices, distances)
+        candidates = [
+            (d, snapshot.item_paths[i])
+            for i, d in zip(indices, distances)
+            if i not in snapshot.tombstones and i not in snapshot.unused_ids
         ]
+        if snapshot.delta_paths:
+            cosines = snapshot.delta_vectors @ normalize(query_embedding)
+            candidates += zip(angular_distance(cosines).tolist(), snapshot.delta_paths)
+        candidates.sort(key=lambda candidate: candidate[0])
+
+        similar_files = [(path, 1 / (1 + d)) for d, path in candidates[: n + 1]]
         return similar_files[1:]  # exclude self
 
     def find_similar_to_file(self, path: str, n: int = 5) -> List[Tuple[str, float]]:
         return super().find_similar_to_file(path, n)
-
-    @cached_property
-    def embedding_cache_file(self) -> str:
-        return self.storage.embedding_cache_file(self.embedder.identifier)
@@ -0,0 +1,152 @@
+import os
+from typing import Dict, Iterator, List, Optional, Set
+
+import numpy as np
+
+from noter_gpt.database.journaled_table import Journal
+
+
+class EmbeddingStore:
+    """Stores embeddings as rows of a memory-mapped float32 matrix
+
+    The matrix file holds nothing but raw float32 rows. A small JSON manifest
+    maps every key to its content hash and row. New keys reuse a freed row or
+    are appended, and changed keys overwrite their row in place, so updating
+    a single note never rewrites the matrix. Rows are stable: a key keeps its
+    row until it is removed, so rows double as document ids. Changes to the manifest are
+    appended to a journal that is only folded back into the manifest once it
+    grows large, so flushing a single change doesn't rewrite it either.
+    """
+
+    def __init__(self, matrix_file: str, manifest_file: str, dimension: int):
+        self.matrix_file = matrix_file
+        self.manifest_file = manifest_file
+        self.dimension = dimension
+        self.entries: Dict[str, List] = {}  # key -> [hash, row]
+        self.free_rows: List[int] = []
+        self.row_count = 0
+        self.keys: List[Optional[str]] = []  # row -> key, None for free rows
+        self.hash_keys: Dict[str, Set[str]] = {}  # hash -> keys with that hash
+        self.journal = Journal(manifest_file)
+        self._matrix = None
+        self._load()
+
+    @property
+    def journal_file(self) -> str:
+        return self.journal.file
+
+    def _load(self) -> None:
+        manifest = self.journal.load_snapshot()
+        if manifest is None or manifest.get("dimension") != self.dimension:
+            return
+        self.entries = manifest["entries"]
+        self.free_rows = manifest["free_rows"]
+        self.row_count = manifest["row_count"]
+        for change in self.journal.replay():
+            if change[0] == "put":
+                _, key, doc_hash, row = change
+                if row in self.free_rows:
+                    self.free_rows.remove(row)
+                self.row_count = max(self.row_count, row + 1)
+                self.entries[key] = [doc_hash, row]
+            else:
+                entry = self.entries.pop(change[1], None)
+                if entry:
+                    self.free_rows.append(entry[1])
+        self.keys = [None] * self.row_count
+        for key, (doc_hash, row) in self.entries.items():
+            self.keys[row] = key
+            self.hash_keys.setdefault(doc_hash, set()).add(key)
+
+    def flush(self) -> None:
+        """Persists the manifest, rows are written through as they are added"""
+        self.journal.flush(self._manifest, len(self.entries))
+
+    def _manifest(self) -> dict:
+        return {
+            "dimension": self.dimension,
+            "row_count": self.row_count,
+            "free_rows": self.free_rows,
+            "entries": self.entries,
+        }
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """All rows of the store, including freed ones, as a read-only memmap"""
+        if self.row_count == 0:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        if self._matrix is None or len(self._matrix) != self.row_count:
+            self._matrix = np.memmap(
+                self.matrix_file,
+                dtype=np.float32,
+                mode="r",
+                shape=(self.row_count, self.dimension),
+            )
+        return self._matrix
+
+    def put(self, key: str, doc_hash: str, vector: np.ndarray) -> int:
+        entry = self.entries.get(key)
+        if entry:
+            row = entry[1]
+            self._forget_hash(key, entry[0])
+        elif self.free_rows:
+            row = self.free_rows.pop()
+        else:
+            row = self.row_count
+        self._write_row(row, vector)
+        self.row_count = max(self.row_count, row + 1)
+        self.keys += [None] * (self.row_count - len(self.keys))
+        self.keys[row] = key
+        self.entries[key] = [doc_hash, row]
+        self.hash_keys.setdefault(doc_hash, set()).add(key)
+        self.journal.append(["put", key, doc_hash, row])
+        return row
+
+    def _write_row(self, row: int, vector: np.ndarray) -> None:
+        data = np.asarray(vector, dtype=np.float32).reshape(self.dimension)
+        mode = "r+b" if os.path.exists(self.matrix_file) else "w+b"
+        with open(self.matrix_file, mode) as f:
+            f.seek(row * self.dimension * data.itemsize)
+            f.write(data.tobytes())
+
+    def remove(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if entry:
+            self.free_rows.append(entry[1])
+            self.keys[entry[1]] = None
+            self._forget_hash(key, entry[0])
+            self.journal.append(["remove", key])
+
+    def _forget_hash(self, key: str, doc_hash: str) -> None:
+        keys = self.hash_keys.get(doc_hash)
+        if keys:
+            keys.discard(key)
+            if not keys:
+                del self.hash_keys[doc_hash]
+
+    def hash(self, key: str) -> Optional[str]:
+        entry = self.entries.get(key)
+        return entry[0] if entry else None
+
+    def key_with_hash(self, doc_hash: str) -> Optional[str]:
+        """Any key stored with the given hash"""
+        keys = self.hash_keys.get(doc_hash)
+        return next(iter(keys)) if keys else None
+
+    def row(self, key: str) -> int:
+        return self.entries[key][1]
+
+    def key(self, row: int) -> Optional[str]:
+        return self.keys[row]
+
+    def vector(self, key: str) -> np.ndarray:
+        return self.matrix[self.entries[key][1]]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -2,9 +2,15 @@ from noter_gpt.storage import Storage
 from noter_gpt.embedder.interface import EmbedderInterface
 from noter_gpt.database.interface import VectorDatabaseInterface
 from noter_gpt.database.annoy_database import AnnoyDatabase
+from noter_gpt.database.numpy_database import NumpyDatabase
+
+# exact brute force search beats rebuilding an annoy forest up to about here
+NUMPY_DATABASE_MAX_NOTES = 50_000
 
 
 def inject_database(
     storage: Storage, embedder: EmbedderInterface
 ) -> VectorDatabaseInterface:
+    if len(storage.all_notes()) <= NUMPY_DATABASE_MAX_NOTES:
+        return NumpyDatabase(storage=storage, embedder=embedder)
     return AnnoyDatabase(storage=storage, embedder=embedder)
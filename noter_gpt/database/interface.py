@@ -1,67 +1,211 @@
 import os
-import hashlib
-import json
 from abc import ABC, abstractmethod
-from typing import List, Tuple
+from collections import Counter
+from typing import List, Optional, Tuple
 from functools import cached_property
 
+import numpy as np
+
+from noter_gpt.embedder.interface import EmbedderInterface, pool_passages
+from noter_gpt.embedder.transformers_embedder import TransformersEmbedder
 from noter_gpt.storage import Storage
+from noter_gpt.manifest import hash_text
+from noter_gpt.database.embedding_store import EmbeddingStore
+from noter_gpt.database.journaled_table import JournaledTable
+from noter_gpt.database.knn_graph import KnnGraph
+from noter_gpt.database.utils import angular_distance
+
+EMBED_BATCH_SIZE = 256  # stale notes handed to the embedder at once
 
 
 class VectorDatabaseInterface(ABC):
     """Stores vectors and allows retrieval by similarity"""
 
-    def __init__(self, storage: Storage = None):
+    def __init__(self, storage: Storage = None, embedder: EmbedderInterface = None):
         self.storage = storage
         if not self.storage:
             self.storage = Storage()
-        self.documents = {}  # Stores file paths, hashes, and embeddings
+        self.embedder = embedder
+        if not self.embedder:
+            self.embedder = TransformersEmbedder()
+        self.documents: EmbeddingStore = None  # Stores hashes and embeddings
+        # passages are embedded once per distinct content and shared by notes
+        self.passages: EmbeddingStore = None
+        self.passage_refs: JournaledTable = None  # path -> [[hash, weight], ...]
+        self.passage_counts: Counter = Counter()
+        self.documents_loaded = False
+        self.graph: KnnGraph = None  # Related notes of every stored note
         self.need_rebuild = True  # Flag to check if rebuild is required
 
     def _load_documents(self) -> None:
-        try:
-            with open(self.embedding_cache_file, "r") as f:
-                self.documents = json.load(f)
-        except FileNotFoundError:
-            self.documents = {}
+        self.documents = EmbeddingStore(
+            self.embedding_matrix_file,
+            self.embedding_cache_file,
+            self.dimension(),
+        )
+        self.passages = EmbeddingStore(
+            self.passage_matrix_file,
+            self.passage_cache_file,
+            self.dimension(),
+        )
+        self.passage_refs = JournaledTable(self.passage_refs_file)
+        self.passage_counts = Counter(
+            passage_hash
+            for refs in self.passage_refs.entries.values()
+            for passage_hash, _ in refs
+        )
+        self.graph = KnnGraph(self.knn_graph_file)
+        self.graph.load()
+        self.documents_loaded = True
 
     def _save_documents(self) -> None:
-        with open(self.embedding_cache_file, "w+") as f:
-            json.dump(self.documents, f)
+        self.passages.flush()
+        self.passage_refs.flush()
+        self.documents.flush()
+        self._update_graph()
+
+    def _update_graph(self) -> None:
+        hashes = [
+            self.documents.hash(key) if key else None for key in self.documents.keys
+        ]
+        self.graph.sync(self.documents.matrix, hashes)
+        self.graph.save()
 
     def build_or_update_index(self) -> None:
-        self._load_documents()
+        if not self.documents_loaded:
+            self._load_documents()
 
         all_file_paths = self.storage.all_notes()
+        manifest = self.storage.manifest
+        documents_changed = False
+        stale_documents = []
 
         for file_path in all_file_paths:
-            with open(file_path, "r", encoding="utf-8") as file:
-                text = file.read()
-
-            doc_hash = hashlib.md5(text.encode("utf-8")).hexdigest()
+            # only notes whose stat changed since they were last hashed get read
+            doc_hash = manifest.hash(file_path)
+            if doc_hash is None:
+                continue
 
             if (
-                file_path not in self.documents
-                or self.documents[file_path]["hash"] != doc_hash
+                self.documents.hash(file_path) != doc_hash
+                or file_path not in self.passage_refs
             ):
-                embedding = self.get_embedding(text)
-                self.documents[file_path] = {"hash": doc_hash, "embedding": embedding}
-                self.need_rebuild = True
+                with open(file_path, "r", encoding="utf-8") as file:
+                    stale_documents.append((file_path, file.read()))
+                if len(stale_documents) >= EMBED_BATCH_SIZE:
+                    self._embed_documents(stale_documents)
+                    stale_documents = []
+                documents_changed = True
+
+        if stale_documents:
+            self._embed_documents(stale_documents)
 
         # Remove documents that no longer exist
-        self.documents = {
-            fp: v for fp, v in self.documents.items() if fp in all_file_paths
-        }
+        existing_file_paths = set(all_file_paths)
+        removed_file_paths = [
+            fp for fp in self.documents if fp not in existing_file_paths
+        ]
+        for file_path in removed_file_paths:
+            self._remove_document(file_path)
+        if removed_file_paths:
+            documents_changed = True
+
+        manifest.prune(all_file_paths)
+        manifest.save()
 
         if self.need_rebuild:
             self.rebuild_index()
 
+        if documents_changed:
+            self._save_documents()
+        else:
+            self._update_graph()  # the graph may predate the stored embeddings
+
+    def upsert(self, path: str, text: str) -> None:
+        """Embeds a single note and applies it to the index in place"""
+        if not self.documents_loaded:
+            self._load_documents()
+        doc_hash = hash_text(text)
+        if self.documents.hash(path) == doc_hash:
+            return
+        self._embed_documents([(path, text)])
         self._save_documents()
 
-    @abstractmethod
+    def delete(self, path: str) -> None:
+        """Removes a single note from the index in place"""
+        if not self.documents_loaded:
+            self._load_documents()
+        if path not in self.documents:
+            return
+        self._remove_document(path)
+        self._save_documents()
+
+    def _embed_documents(self, documents: List[Tuple[str, str]]) -> None:
+        """Embeds the passages not seen before and pools them per document
+
+        Vectors are addressed by content, so a note that was renamed, moved or
+        copied reuses the passages of the note it matches and isn't even split.
+        """
+        doc_hashes = [hash_text(text) for _, text in documents]
+        all_refs = []
+        missing_passages = {}
+        for (_, text), doc_hash in zip(documents, doc_hashes):
+            twin = self.documents.key_with_hash(doc_hash)
+            if twin in self.passage_refs:
+                all_refs.append(self.passage_refs.get(twin))
+                continue
+            refs = []
+            for passage in self.embedder.split_passages(text):
+                passage_hash = hash_text(passage)
+                refs.append([passage_hash, len(passage)])
+                if passage_hash not in self.passages:
+                    missing_passages[passage_hash] = passage
+            all_refs.append(refs)
+
+        embeddings = self.get_embeddings(list(missing_passages.values()))
+        for passage_hash, embedding in zip(missing_passages, embeddings):
+            self.passages.put(passage_hash, passage_hash, embedding)
+
+        for (file_path, _), doc_hash, refs in zip(documents, doc_hashes, all_refs):
+            vectors = np.stack([self.passages.vector(h) for h, _ in refs])
+            embedding = pool_passages(vectors, [weight for _, weight in refs])
+            self.documents.put(file_path, doc_hash, embedding)
+        # retain every new passage before releasing old ones shared in the batch
+        old_refs = [self.passage_refs.get(file_path, []) for file_path, _ in documents]
+        for (file_path, _), refs in zip(documents, all_refs):
+            self.passage_refs.put(file_path, refs)
+            self.passage_counts.update(passage_hash for passage_hash, _ in refs)
+        for refs in old_refs:
+            self._release_passages(refs)
+        for file_path, _ in documents:
+            self._document_updated(file_path)
+
+    def _remove_document(self, path: str) -> None:
+        self._document_removed(path)
+        self.documents.remove(path)
+        self._release_passages(self.passage_refs.get(path, []))
+        self.passage_refs.remove(path)
+
+    def _release_passages(self, refs: List[list]) -> None:
+        for passage_hash, _ in refs:
+            self.passage_counts[passage_hash] -= 1
+            if self.passage_counts[passage_hash] <= 0:
+                del self.passage_counts[passage_hash]
+                self.passages.remove(passage_hash)
+
+    def _document_updated(self, path: str) -> None:
+        """Called after the embedding of `path` was added or changed"""
+        self.need_rebuild = True
+
+    def _document_removed(self, path: str) -> None:
+        """Called before the embedding of `path` is removed"""
+        self.need_rebuild = True
+
     def get_embedding(self, text: str) -> List[float]:
-        """Should return the embedding of the given text"""
-        pass
+        return self.embedder.embed_text(text).tolist()
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self.embedder.embed_batch(texts).tolist()
 
     @abstractmethod
     def rebuild_index(self) -> None:
@@ -81,8 +225,59 @@ class VectorDatabaseInterface(ABC):
             file_contents = file.read()
         return self.find_similar(file_contents, n)
 
+    def find_similar_to_note(
+        self, note: str, text: str, n: int = 5
+    ) -> List[Tuple[str, float]]:
+        """Finds the notes most similar to a note, given its current text
+
+        Saved notes are answered from the neighbour graph without touching the
+        embedder. Text that differs from what was indexed is embedded instead.
+        """
+        similar_notes = self._graph_neighbours(note, text, n)
+        if similar_notes is None:
+            return self.find_similar(text, n)
+        return similar_notes
+
+    def _graph_neighbours(
+        self, note: str, text: str, n: int
+    ) -> Optional[List[Tuple[str, float]]]:
+        graph = self.graph
+        if graph is None or n > graph.k:
+            return None
+        # one lookup, the indexer may remove the note between two of them
+        entry = self.documents.entries.get(note)
+        if entry is None or entry[0] != hash_text(text):
+            return None
+        similar_notes = []
+        for row, cosine in graph.neighbours_of(entry[1], n):
+            path = self.documents.key(row)
+            if path is not None:  # removed while we were reading
+                similar_notes.append((path, float(1 / (1 + angular_distance(cosine)))))
+        return similar_notes
+
+    def dimension(self) -> int:
+        return self.embedder.dimension()
+
     @cached_property
-    @abstractmethod
     def embedding_cache_file(self) -> str:
-        """Should return the path to the file where the embeddings are cached"""
-        pass
+        return self.storage.embedding_cache_file(self.embedder.identifier)
+
+    @cached_property
+    def embedding_matrix_file(self) -> str:
+        return self.storage.embedding_matrix_file(self.embedder.identifier)
+
+    @cached_property
+    def passage_cache_file(self) -> str:
+        return self.storage.passage_cache_file(self.embedder.identifier)
+
+    @cached_property
+    def passage_matrix_file(self) -> str:
+        return self.storage.passage_matrix_file(self.embedder.identifier)
+
+    @cached_property
+    def passage_refs_file(self) -> str:
+        return self.storage.passage_refs_file(self.embedder.identifier)
+
+    @cached_property
+    def knn_graph_file(self) -> str:
+        return self.storage.knn_graph_file(self.embedder.identifier)
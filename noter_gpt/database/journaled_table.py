@@ -0,0 +1,132 @@
+import os
+import json
+from typing import Any, Callable, Dict, Iterator
+
+
+class Journal:
+    """Changes to a JSON snapshot file, appended to a journal next to it
+
+    Changes are appended to the journal and only folded back into the snapshot
+    once the journal grows larger than what it describes, so flushing a few
+    changes never rewrites the whole snapshot. A torn final line, left by a
+    crash while appending, is cut off on replay.
+    """
+
+    def __init__(self, snapshot_file: str):
+        self.snapshot_file = snapshot_file
+        self.pending: list = []  # changes not yet flushed
+        self.length = 0  # changes in the journal file
+
+    @property
+    def file(self) -> str:
+        return f"{self.snapshot_file}.journal"
+
+    def load_snapshot(self) -> Any:
+        """The snapshot, or None if there is no readable one"""
+        try:
+            with open(self.snapshot_file, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def replay(self) -> Iterator[list]:
+        """Changes journaled since the snapshot, oldest first"""
+        try:
+            with open(self.file, "rb") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        end = 0  # offset just past the last complete change
+        for line in lines:
+            if not line.endswith(b"\n"):
+                break  # torn final write
+            try:
+                change = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            end += len(line)
+            self.length += 1
+            yield change
+        if end < sum(map(len, lines)):
+            # cut a torn final write so later appends start on a fresh line
+            with open(self.file, "r+b") as f:
+                f.truncate(end)
+
+    def append(self, change: list) -> None:
+        self.pending.append(change)
+
+    def flush(self, snapshot: Callable[[], Any], size: int) -> None:
+        """Persists pending changes, compacting into `snapshot()` when due
+
+        `size` is the number of entries the snapshot holds.
+        """
+        if not self.pending:
+            return
+        journal_limit = max(1000, size)
+        if (
+            os.path.exists(self.snapshot_file)
+            and self.length + len(self.pending) <= journal_limit
+        ):
+            with open(self.file, "a") as f:
+                f.writelines(json.dumps(change) + "\n" for change in self.pending)
+            self.length += len(self.pending)
+        else:
+            self.compact(snapshot())
+        self.pending = []
+
+    def compact(self, snapshot: Any) -> None:
+        tmp_file = f"{self.snapshot_file}.tmp"
+        with open(tmp_file, "w+") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_file, self.snapshot_file)
+        if os.path.exists(self.file):
+            os.remove(self.file)
+        self.length = 0
+
+
+class JournaledTable:
+    """A dict of JSON values persisted as a snapshot plus an append-only journal"""
+
+    def __init__(self, table_file: str):
+        self.table_file = table_file
+        self.entries: Dict[str, Any] = {}
+        self.journal = Journal(table_file)
+        self._load()
+
+    @property
+    def journal_file(self) -> str:
+        return self.journal.file
+
+    def _load(self) -> None:
+        entries = self.journal.load_snapshot()
+        if entries is None:
+            return
+        self.entries = entries
+        for change in self.journal.replay():
+            if change[0] == "put":
+                self.entries[change[1]] = change[2]
+            else:
+                self.entries.pop(change[1], None)
+
+    def flush(self) -> None:
+        self.journal.flush(lambda: self.entries, len(self.entries))
+
+    def put(self, key: str, value: Any) -> None:
+        self.entries[key] = value
+        self.journal.append(["put", key, value])
+
+    def remove(self, key: str) -> None:
+        if self.entries.pop(key, None) is not None:
+            self.journal.append(["remove", key])
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.entries.get(key, default)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -0,0 +1,191 @@
+import os
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+GRAPH_NEIGHBOURS = 10  # neighbours kept per note
+BLOCK_ROWS = 512  # rows scored per matrix product when building
+
+
+class KnnTable(NamedTuple):
+    neighbours: np.ndarray  # (rows, k) int32, -1 where there is no neighbour
+    scores: np.ndarray  # (rows, k) float32 cosine similarity, best first
+    hashes: np.ndarray  # content hash each row was last scored with
+
+
+class KnnGraph:
+    """The k most similar notes of every stored note, persisted to disk
+
+    Rows line up with the embedding store rows. A full build scores blocks of
+    rows against the whole matrix at once. After that a changed row only
+    rescores itself, inserts itself into the rows it now beats, and rescores
+    the rows that used to point at it.
+    """
+
+    def __init__(self, graph_file: str, k: int = GRAPH_NEIGHBOURS):
+        self.graph_file = graph_file
+        self.k = k
+        self.table: KnnTable = None
+        self.norms = np.zeros(0, dtype=np.float32)
+        self.dirty = False
+
+    def load(self) -> None:
+        try:
+            with np.load(self.graph_file) as data:
+                table = KnnTable(data["neighbours"], data["scores"], data["hashes"])
+        except (FileNotFoundError, OSError, KeyError, ValueError):
+            return
+        if table.neighbours.shape[1] == self.k:
+            self.table = table
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        tmp_file = f"{self.graph_file}.tmp.npz"
+        np.savez(tmp_file, **self.table._asdict())
+        os.replace(tmp_file, self.graph_file)
+        self.dirty = False
+
+    def sync(self, matrix: np.ndarray, hashes: List[Optional[str]]) -> None:
+        """Brings the graph up to date with the store
+
+        `hashes` holds the content hash of every store row, None for free rows.
+        Rows whose hash differs from the one they were scored with are updated
+        one by one, unless that would cost more than building from scratch.
+        """
+        if self.table is None or len(self.table.hashes) > len(hashes):
+            self._build(matrix, hashes)
+            return
+        stale_rows = self._stale_rows(hashes)
+        if not stale_rows:
+            return
+        # each update costs about k + 1 matrix-vector products
+        if len(stale_rows) * (self.k + 1) > len(hashes):
+            self._build(matrix, hashes)
+            return
+
+        alive = np.array([h is not None for h in hashes], dtype=bool)
+        self._resize(len(hashes))
+        self.norms = self._norms(matrix)
+        for row in stale_rows:
+            if alive[row]:
+                self._update(row, matrix, alive)
+            else:
+                self._remove(row, matrix, alive)
+            self.table.hashes[row] = hashes[row] or ""
+        self.dirty = True
+
+    def neighbours_of(self, row: int, n: int) -> List[Tuple[int, float]]:
+        table = self.table
+        if table is None or row >= len(table.neighbours):
+            return []
+        return [
+            (int(other), float(score))
+            for other, score in zip(table.neighbours[row][:n], table.scores[row][:n])
+            if other >= 0
+        ]
+
+    def _stale_rows(self, hashes: List[Optional[str]]) -> List[int]:
+        stored = self.table.hashes
+        return [
+            row
+            for row, doc_hash in enumerate(hashes)
+            if (stored[row] if row < len(stored) else "") != (doc_hash or "")
+        ]
+
+    def _build(self, matrix: np.ndarray, hashes: List[Optional[str]]) -> None:
+        rows = len(hashes)
+        alive = np.array([h is not None for h in hashes], dtype=bool)
+        self.norms = self._norms(matrix)
+        neighbours = np.full((rows, self.k), -1, dtype=np.int32)
+        scores = np.full((rows, self.k), -np.inf, dtype=np.float32)
+        for start in range(0, rows, BLOCK_ROWS):
+            end = min(start + BLOCK_ROWS, rows)
+            block = self._cosines(matrix, start, end, alive)
+            for i, row_cosines in enumerate(block):
+                if alive[start + i]:
+                    neighbours[start + i], scores[start + i] = self._top_k(row_cosines)
+        self.table = KnnTable(neighbours, scores, self._hash_array(hashes))
+        self.dirty = True
+
+    def _update(self, row: int, matrix: np.ndarray, alive: np.ndarray) -> None:
+        neighbours, scores, _ = self.table
+        cosines = self._cosines(matrix, row, row + 1, alive)[0]
+        neighbours[row], scores[row] = self._top_k(cosines)
+
+        # rows that listed this one may now rank something else above it
+        pointed_at_row = (neighbours == row).any(axis=1) & alive
+        for other in np.flatnonzero(pointed_at_row):
+            self._rescore(other, matrix, alive)
+        # rows that should now list this one
+        beats = (cosines > scores[:, -1]) & ~pointed_at_row
+        for other in np.flatnonzero(beats):
+            self._insert(other, row, cosines[other])
+
+    def _remove(self, row: int, matrix: np.ndarray, alive: np.ndarray) -> None:
+        neighbours, scores, _ = self.table
+        neighbours[row] = -1
+        scores[row] = -np.inf
+        pointed_at_row = (neighbours == row).any(axis=1) & alive
+        for other in np.flatnonzero(pointed_at_row):
+            self._rescore(other, matrix, alive)
+
+    def _rescore(self, row: int, matrix: np.ndarray, alive: np.ndarray) -> None:
+        cosines = self._cosines(matrix, row, row + 1, alive)[0]
+        self.table.neighbours[row], self.table.scores[row] = self._top_k(cosines)
+
+    def _insert(self, row: int, neighbour: int, score: float) -> None:
+        neighbours = self.table.neighbours[row]
+        scores = self.table.scores[row]
+        position = int(np.searchsorted(-scores, -score))
+        neighbours[position + 1 :] = neighbours[position:-1].copy()
+        scores[position + 1 :] = scores[position:-1].copy()
+        neighbours[position] = neighbour
+        scores[position] = score
+
+    def _cosines(
+        self, matrix: np.ndarray, start: int, end: int, alive: np.ndarray
+    ) -> np.ndarray:
+        """Cosines of rows start to end against every row, -inf where excluded"""
+        rows = len(alive)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cosines = (matrix[start:end] @ matrix[:rows].T) / np.outer(
+                self.norms[start:end], self.norms[:rows]
+            )
+        cosines[:, ~alive] = -np.inf
+        cosines[~np.isfinite(cosines)] = -np.inf
+        cosines[np.arange(end - start), np.arange(start, end)] = -np.inf  # self
+        return cosines
+
+    def _top_k(self, cosines: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        neighbours = np.full(self.k, -1, dtype=np.int32)
+        scores = np.full(self.k, -np.inf, dtype=np.float32)
+        count = min(self.k, int(np.isfinite(cosines).sum()))
+        if count:
+            top = np.argpartition(-cosines, count - 1)[:count]
+            top = top[np.argsort(-cosines[top])]
+            neighbours[:count] = top
+            scores[:count] = cosines[top]
+        return neighbours, scores
+
+    def _resize(self, rows: int) -> None:
+        current = len(self.table.neighbours)
+        if current >= rows:
+            return
+        extra = rows - current
+        # swap all arrays in at once so readers never see them disagree
+        self.table = KnnTable(
+            np.vstack([self.table.neighbours, np.full((extra, self.k), -1, np.int32)]),
+            np.vstack(
+                [self.table.scores, np.full((extra, self.k), -np.inf, np.float32)]
+            ),
+            np.concatenate([self.table.hashes, self._hash_array([None] * extra)]),
+        )
+
+    @staticmethod
+    def _norms(matrix: np.ndarray) -> np.ndarray:
+        return np.linalg.norm(matrix, axis=1).astype(np.float32)
+
+    @staticmethod
+    def _hash_array(hashes: List[Optional[str]]) -> np.ndarray:
+        return np.array([h or "" for h in hashes], dtype="<U32")
@@ -0,0 +1,98 @@
+from typing import List, NamedTuple, Tuple
+
+import numpy as np
+
+from noter_gpt.embedder.interface import EmbedderInterface
+from noter_gpt.storage import Storage
+from noter_gpt.database.interface import VectorDatabaseInterface
+from noter_gpt.database.utils import angular_distance, normalize
+
+
+class NumpyRows(NamedTuple):
+    vectors: np.ndarray  # normalized, row-aligned with the embedding store
+    alive: np.ndarray
+    paths: List[str]
+
+
+class NumpyDatabase(VectorDatabaseInterface):
+    """Exact search with one matrix-vector product over normalized embeddings
+
+    Rows line up with the rows of the embedding store, so adding, changing or
+    removing a note only touches its own row instead of rebuilding an index.
+    Resizing swaps in all arrays at once so queries never see them disagree.
+    """
+
+    def __init__(
+        self,
+        storage: Storage = None,
+        embedder: EmbedderInterface = None,
+    ):
+        super().__init__(storage=storage, embedder=embedder)
+        self.rows: NumpyRows = None
+
+    def rebuild_index(self) -> None:
+        row_count = self.documents.row_count
+        alive = np.zeros(row_count, dtype=bool)
+        paths = [None] * row_count
+        for path in self.documents:
+            row = self.documents.row(path)
+            alive[row] = True
+            paths[row] = path
+        self.rows = NumpyRows(normalize(self.documents.matrix), alive, paths)
+        self.need_rebuild = False
+
+    def _document_updated(self, path: str) -> None:
+        if self.rows is None:
+            return  # nothing published yet, the first rebuild picks it up
+        row = self.documents.row(path)
+        if row >= len(self.rows.vectors):
+            self._grow(row + 1)
+        self.rows.vectors[row] = normalize(self.documents.vector(path))
+        self.rows.paths[row] = path
+        self.rows.alive[row] = True
+
+    def _document_removed(self, path: str) -> None:
+        if self.rows is None:
+            return
+        row = self.documents.row(path)
+        self.rows.alive[row] = False
+        self.rows.paths[row] = None
+        self.rows.vectors[row] = 0
+
+    def _grow(self, min_rows: int) -> None:
+        rows = self.rows
+        capacity = max(min_rows, 2 * len(rows.vectors))
+        vectors = np.zeros((capacity, self.dimension()), dtype=np.float32)
+        vectors[: len(rows.vectors)] = rows.vectors
+        alive = np.zeros(capacity, dtype=bool)
+        alive[: len(rows.alive)] = rows.alive
+        paths = rows.paths + [None] * (capacity - len(rows.paths))
+        self.rows = NumpyRows(vectors, alive, paths)
+
+    def find_similar(self, query_text: str, n: int = 5) -> List[Tuple[str, float]]:
+        if not query_text:
+            return []
+
+        rows = self.rows
+        if rows is None:
+            self.rebuild_index()
+            rows = self.rows
+
+        query_embedding = normalize(self.embedder.embed_document(query_text))
+        scores = np.where(rows.alive, rows.vectors @ query_embedding, -np.inf)
+        k = min(n + 1, int(np.isfinite(scores).sum()))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        distances = angular_distance(scores[top])
+        similar_files = [
+            (rows.paths[i], float(1 / (1 + d)))
+            for i, d in zip(top, distances)
+            if rows.paths[i] is not None  # removed while we were searching
+        ]
+        return similar_files[1:]  # exclude self
+
+    def find_similar_to_file(self, path: str, n: int = 5) -> List[Tuple[str, float]]:
+        return super().find_similar_to_file(path, n)
@@ -0,0 +1,13 @@
+import numpy as np
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    normalized = np.zeros(vectors.shape, dtype=np.float32)
+    return np.divide(vectors, norms, out=normalized, where=norms > 0)
+
+
+def angular_distance(cosine: np.ndarray) -> np.ndarray:
+    # matches annoy's angular metric: sqrt(2 - 2 * cosine)
+    return np.sqrt(np.maximum(0, 2 - 2 * cosine))
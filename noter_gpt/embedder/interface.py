@@ -1,9 +1,16 @@
 from abc import ABC, abstractmethod
+from typing import List
 from functools import cached_property
 
 import numpy as np
 
 
+def pool_passages(vectors: np.ndarray, weights: List[float]) -> np.ndarray:
+    """Averages passage vectors, weighting each by the length of its passage"""
+    weights = np.asarray(weights, dtype=np.float32)
+    return (weights @ np.asarray(vectors, dtype=np.float32)) / max(weights.sum(), 1)
+
+
 class EmbedderInterface(ABC):
     """Creates a vector representation of a given text or file"""
 
@@ -12,6 +19,27 @@ class EmbedderInterface(ABC):
         """Should return a vector representation of the given text"""
         pass
 
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Should return one vector per text, batching model calls where possible"""
+        if not texts:
+            return np.empty((0, self.dimension()), dtype=np.float32)
+        return np.stack([self.embed_text(text) for text in texts])
+
+    def split_passages(self, text: str) -> List[str]:
+        """Should split text into passages that are embedded and cached on their own
+
+        Passages should be stable under edits elsewhere in the text, so splits
+        start at paragraphs and long paragraphs are cut to fit the model.
+        """
+        passages = [paragraph.strip() for paragraph in text.split("\n\n")]
+        return [passage for passage in passages if passage] or [text]
+
+    def embed_document(self, text: str) -> np.ndarray:
+        """Embeds every passage of the text and pools them into one vector"""
+        passages = self.split_passages(text)
+        weights = [len(passage) for passage in passages]
+        return pool_passages(self.embed_batch(passages), weights)
+
     @abstractmethod
     def embed_file(self, file_path: str) -> np.ndarray:
         with open(file_path, "r", encoding="utf-8") as file:
@@ -1,24 +1,133 @@
 import os
+import time
+import random
+from typing import Iterator, List
 from functools import cached_property
+from concurrent.futures import ThreadPoolExecutor
 
+import httpx
 import numpy as np
-from openai import OpenAI
+from openai import (
+    OpenAI,
+    APIConnectionError,
+    InternalServerError,
+    RateLimitError,
+)
 
 from noter_gpt.embedder.interface import EmbedderInterface
+from noter_gpt.summarizer.util import chunk_text
+
+# the model takes 8191 tokens, and dense text such as CJK can take a token per
+# character, so passages are cut to fewer characters than that
+MAX_INPUT_CHARS = 8000
+MAX_REQUEST_INPUTS = 2048  # API limit on inputs per request
+MAX_REQUEST_TOKENS = 100_000  # tokens packed into one request, at most
+CONCURRENT_REQUESTS = 4
+MAX_RETRIES = 6
+INITIAL_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 60.0
+
+
+def estimate_tokens(text: str) -> int:
+    # roughly 4 characters per token for english text
+    return len(text) // 4 + 1
 
 
 class OpenAIEmbedder(EmbedderInterface):
-    def __init__(self, model_name: str = "text-embedding-ada-002"):
+    def __init__(
+        self,
+        model_name: str = "text-embedding-ada-002",
+        api_key: str = None,
+        base_url: str = None,
+        concurrent_requests: int = CONCURRENT_REQUESTS,
+        max_request_tokens: int = MAX_REQUEST_TOKENS,
+        initial_backoff_seconds: float = INITIAL_BACKOFF_SECONDS,
+    ):
         self.model_name = model_name
-        self.client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+        self.concurrent_requests = concurrent_requests
+        self.max_request_tokens = max_request_tokens
+        self.initial_backoff_seconds = initial_backoff_seconds
+        # one pooled client shared by every request thread, retries handled below
+        self.client = OpenAI(
+            api_key=api_key if api_key else os.environ["OPENAI_API_KEY"],
+            base_url=base_url,
+            max_retries=0,
+            http_client=httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=concurrent_requests,
+                    max_keepalive_connections=concurrent_requests,
+                )
+            ),
+        )
 
     def embed_text(self, text: str) -> np.ndarray:
-        text = text.replace("\n", " ")
-        return np.array(
-            self.client.embeddings.create(input=[text], model=self.model_name)
-            .data[0]
-            .embedding
+        return self.embed_batch([text])[0]
+
+    def split_passages(self, text: str) -> List[str]:
+        passages = []
+        for paragraph in super().split_passages(text):
+            passages.extend(chunk_text(paragraph, MAX_INPUT_CHARS))
+        return passages
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        texts = [text.replace("\n", " ") for text in texts]
+        embeddings = np.zeros((len(texts), self.dimension()), dtype=np.float32)
+        # the API rejects empty inputs, empty notes keep a zero vector
+        batches = list(self._batches(texts))
+        with ThreadPoolExecutor(self.concurrent_requests) as pool:
+            results = pool.map(
+                self._create_embeddings, [[texts[i] for i in b] for b in batches]
+            )
+            for batch, result in zip(batches, results):
+                embeddings[batch] = result
+        return embeddings
+
+    def _batches(self, texts: List[str]) -> Iterator[List[int]]:
+        """Packs texts into requests under the input and token limits"""
+        batch = []
+        batch_tokens = 0
+        for i, text in enumerate(texts):
+            if not text.strip():
+                continue
+            # dense text such as CJK can take a token per character
+            tokens = len(text)
+            if batch and (
+                len(batch) >= MAX_REQUEST_INPUTS
+                or batch_tokens + tokens > self.max_request_tokens
+            ):
+                yield batch
+                batch = []
+                batch_tokens = 0
+            batch.append(i)
+            batch_tokens += tokens
+        if batch:
+            yield batch
+
+    def _create_embeddings(self, inputs: List[str]) -> List[List[float]]:
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                response = self.client.embeddings.create(
+                    input=inputs, model=self.model_name
+                )
+                break
+            except (RateLimitError, APIConnectionError, InternalServerError) as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                time.sleep(self._backoff_seconds(attempt, e))
+        return [data.embedding for data in sorted(response.data, key=lambda d: d.index)]
+
+    def _backoff_seconds(self, attempt: int, error: Exception) -> float:
+        response = getattr(error, "response", None)
+        retry_after = (
+            response.headers.get("retry-after") if response is not None else None
         )
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        delay = min(MAX_BACKOFF_SECONDS, self.initial_backoff_seconds * 2**attempt)
+        return random.uniform(delay / 2, delay)
 
     def embed_file(self, file_path: str) -> np.ndarray:
         return super().embed_file(file_path)
@@ -1,3 +1,4 @@
+from typing import Iterator, List
 from functools import cached_property
 
 import numpy as np
@@ -5,21 +6,71 @@ import torch
 from transformers import AutoModel, AutoTokenizer
 
 from noter_gpt.embedder.interface import EmbedderInterface
+from noter_gpt.summarizer.util import chunk_by_tokens
+
+MAX_INPUT_TOKENS = 512
+MAX_BATCH_TOKENS = 16384  # padded tokens per forward pass
 
 
 class TransformersEmbedder(EmbedderInterface):
-    def __init__(self, model_name: str = "bert-base-uncased"):
+    def __init__(
+        self,
+        model_name: str = "bert-base-uncased",
+        max_batch_tokens: int = MAX_BATCH_TOKENS,
+    ):
         self.model_name = model_name
+        self.max_batch_tokens = max_batch_tokens
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
         self.model = AutoModel.from_pretrained(model_name)
 
     def embed_text(self, text: str) -> np.ndarray:
-        inputs = self.tokenizer(
-            text, return_tensors="pt", truncation=True, max_length=512
-        )
-        with torch.no_grad():
-            outputs = self.model(**inputs)
-        return outputs.last_hidden_state.mean(dim=1).squeeze().numpy()
+        return self.embed_batch([text])[0]
+
+    def split_passages(self, text: str) -> List[str]:
+        passages = []
+        for paragraph in super().split_passages(text):
+            # a paragraph this short can't exceed the limit, skip tokenizing it
+            if len(paragraph) < MAX_INPUT_TOKENS - 2:
+                passages.append(paragraph)
+            elif len(self.tokenizer.tokenize(paragraph)) < MAX_INPUT_TOKENS - 2:
+                passages.append(paragraph)
+            else:
+                chunks = chunk_by_tokens(paragraph, self.tokenizer)
+                passages.extend(chunk.strip(". ") for chunk in chunks)
+        return passages
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return super().embed_batch(texts)
+        input_ids = self.tokenizer(
+            list(texts), truncation=True, max_length=MAX_INPUT_TOKENS
+        )["input_ids"]
+        embeddings = np.zeros((len(texts), self.dimension()), dtype=np.float32)
+
+        # sorting by length keeps the padding within each batch small
+        order = sorted(range(len(texts)), key=lambda i: len(input_ids[i]))
+        for batch in self._batches(order, input_ids):
+            inputs = self.tokenizer.pad(
+                {"input_ids": [input_ids[i] for i in batch]}, return_tensors="pt"
+            )
+            with torch.no_grad():
+                outputs = self.model(**inputs)
+            mask = inputs["attention_mask"].unsqueeze(-1).to(torch.float32)
+            summed = (outputs.last_hidden_state * mask).sum(dim=1)
+            embeddings[batch] = (summed / mask.sum(dim=1).clamp(min=1)).numpy()
+        return embeddings
+
+    def _batches(self, order: List[int], input_ids: List[List[int]]) -> Iterator:
+        """Yields batches whose padded size stays within max_batch_tokens"""
+        batch = []
+        for i in order:
+            # order is sorted by length so the newest item sets the padded length
+            if batch and (len(batch) + 1) * len(input_ids[i]) > self.max_batch_tokens:
+                yield batch
+                batch = []
+            batch.append(i)
+        if batch:
+            yield batch
 
     def embed_file(self, file_path: str) -> np.ndarray:
         return super().embed_file(file_path)
@@ -29,4 +80,4 @@ class TransformersEmbedder(EmbedderInterface):
 
     @cached_property
     def identifier(self) -> str:
-        f"TransformersEmbedder_{self.model_name}"
+        return f"TransformersEmbedder_{self.model_name}"
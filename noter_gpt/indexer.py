@@ -0,0 +1,135 @@
+import time
+import logging
+import threading
+from typing import Callable, Iterable, List, Optional, Set
+
+from noter_gpt.database.interface import VectorDatabaseInterface
+from noter_gpt.watcher.interface import WatcherInterface
+
+DEBOUNCE_SECONDS = 0.5  # quiet time before a burst of changes is applied
+MAX_DELAY_SECONDS = 5.0  # longest a change waits behind a continuous burst
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundIndexer:
+    """Keeps the vector database in sync with the notes off the request path
+
+    A watcher thread collects changed notes into a queue, and a single worker
+    thread applies them to the database once edits have gone quiet for
+    DEBOUNCE_SECONDS. The worker is the only writer, so request handlers only
+    ever read the index.
+    """
+
+    def __init__(
+        self,
+        database: VectorDatabaseInterface,
+        watcher: WatcherInterface,
+        debounce_seconds: float = DEBOUNCE_SECONDS,
+    ):
+        self.database = database
+        self.watcher = watcher
+        self.debounce_seconds = debounce_seconds
+        self.pending: Set[str] = set()
+        self.rescan = False
+        self.lock = threading.Lock()
+        self.changed = threading.Event()
+        self.idle = threading.Event()
+        self.idle.set()
+        self.stopped = threading.Event()
+        self.listeners: List[Callable[[Optional[List[str]]], None]] = []
+        self.threads = [
+            threading.Thread(target=self._watch, name="noter-watcher", daemon=True),
+            threading.Thread(target=self._work, name="noter-indexer", daemon=True),
+        ]
+
+    def start(self) -> None:
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.changed.set()
+        self.watcher.close()
+        for thread in self.threads:
+            thread.join()
+
+    def subscribe(self, listener: Callable[[Optional[List[str]]], None]) -> None:
+        """Passes every change notified from now on to `listener` as well
+
+        The listener is called with None, meaning every note, right away, as
+        it may have missed earlier changes.
+        """
+        self.listeners.append(listener)
+        listener(None)
+
+    def notify(self, notes: Optional[Iterable[str]] = None) -> None:
+        """Queues notes for indexing, or a full rescan if `notes` is None"""
+        notes = None if notes is None else list(notes)
+        with self.lock:
+            if notes is None:
+                self.rescan = True
+            else:
+                self.pending.update(notes)
+            self.idle.clear()
+        self.changed.set()
+        for listener in self.listeners:
+            listener(notes)
+
+    def wait_until_idle(self, timeout: float = None) -> bool:
+        return self.idle.wait(timeout)
+
+    def _watch(self) -> None:
+        while not self.stopped.is_set():
+            try:
+                changes = self.watcher.changes()
+            except Exception:
+                logger.exception("note watcher failed")
+                self.stopped.wait(self.debounce_seconds)
+                continue
+            if changes is None or changes:
+                self.notify(changes)
+
+    def _work(self) -> None:
+        while not self.stopped.is_set():
+            self.changed.wait()
+            # let a burst of edits settle before touching the index
+            started = time.monotonic()
+            while time.monotonic() - started < MAX_DELAY_SECONDS:
+                self.changed.clear()
+                if self.stopped.wait(self.debounce_seconds):
+                    return
+                if not self.changed.is_set():
+                    break
+
+            with self.lock:
+                notes, self.pending = self.pending, set()
+                rescan, self.rescan = self.rescan, False
+            try:
+                self._apply(notes, rescan)
+            except Exception:
+                logger.exception("updating the note index failed")
+            with self.lock:
+                if not self.pending and not self.rescan:
+                    self.idle.set()
+
+    def _apply(self, notes: Set[str], rescan: bool) -> None:
+        if rescan:
+            self.database.build_or_update_index()
+            return
+        removed = []
+        for note in sorted(notes):
+            path = self.database.storage.note_abs_path(note)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    text = f.read()
+            except FileNotFoundError:
+                removed.append(note)
+                continue
+            self.database.upsert(note, text)
+        # deleting last lets a renamed or moved note reuse the passages of its
+        # old path, which would otherwise be released before the upsert
+        for note in removed:
+            self.database.delete(note)
+        if self.database.need_rebuild:
+            self.database.rebuild_index()
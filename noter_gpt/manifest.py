@@ -0,0 +1,90 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# mtimes this close to the moment a note was hashed can't be trusted to change
+# on the next write, so such notes are re-hashed until they settle
+RACY_WINDOW_NS = 2_000_000_000
+
+
+def hash_text(text: str) -> str:
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+class NoteManifest:
+    """Persisted (size, mtime_ns, inode, content hash) of every note
+
+    Notes are only re-read and re-hashed when their stat signature differs
+    from the one recorded the last time they were hashed, so checking an
+    unchanged notebook for changes costs one stat per note and no reads.
+    """
+
+    def __init__(self, manifest_file: str, root_path: str):
+        self.manifest_file = manifest_file
+        self.root_path = root_path
+        self.entries: Dict[str, List] = self._load()
+        self.dirty = False
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, List]:
+        try:
+            with open(self.manifest_file, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save(self) -> None:
+        with self._lock:
+            if not self.dirty:
+                return
+            tmp_file = f"{self.manifest_file}.tmp"
+            with open(tmp_file, "w+") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_file, self.manifest_file)
+            self.dirty = False
+
+    def hash(self, note: str) -> Optional[str]:
+        """Returns the content hash of the note, or None if it does not exist"""
+        hash_and_mtime = self.hash_and_mtime(note)
+        return hash_and_mtime[0] if hash_and_mtime else None
+
+    def hash_and_mtime(self, note: str) -> Optional[Tuple[str, int]]:
+        """Returns the content hash and mtime_ns of the note, from a single stat"""
+        try:
+            stat = os.stat(os.path.join(self.root_path, note))
+        except FileNotFoundError:
+            self.forget(note)
+            return None
+
+        signature = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+        entry = self.entries.get(note)
+        if entry and entry[:3] == signature:
+            return entry[3], stat.st_mtime_ns
+
+        with open(os.path.join(self.root_path, note), "r", encoding="utf-8") as f:
+            doc_hash = hash_text(f.read())
+
+        if time.time_ns() - stat.st_mtime_ns < RACY_WINDOW_NS:
+            signature = [None, None, None]
+        with self._lock:
+            self.entries[note] = signature + [doc_hash]
+            self.dirty = True
+        return doc_hash, stat.st_mtime_ns
+
+    def forget(self, note: str) -> None:
+        with self._lock:
+            if self.entries.pop(note, None) is not None:
+                self.dirty = True
+
+    def prune(self, notes: Iterable[str]) -> None:
+        """Drops entries for every note not in `notes`"""
+        notes = set(notes)
+        with self._lock:
+            stale = [note for note in self.entries if note not in notes]
+            for note in stale:
+                del self.entries[note]
+            if stale:
+                self.dirty = True
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Iterable, List, Optional
 
 from noter_gpt.storage import Storage
 
@@ -21,6 +21,10 @@ class SearcherInterface(ABC):
         """Searches for the given regex pattern in the documents"""
         pass
 
+    def notify(self, notes: Optional[Iterable[str]] = None) -> None:
+        """Tells the searcher which notes changed, or all of them if None"""
+        pass
+
     @abstractmethod
     def is_available(self) -> bool:
         """Returns True if the searcher is available for immediate use"""
@@ -1,28 +1,98 @@
 import re
-from typing import List
+import threading
+from typing import Iterable, List, Optional, Set
 
 from noter_gpt.storage import Storage
+from noter_gpt.searcher.text_index import TextIndex
+from noter_gpt.searcher.trigram_index import TrigramIndex
 from noter_gpt.searcher.utils import relativize_paths
 from noter_gpt.searcher.interface import SearcherInterface
 
 
 class NativeSearcher(SearcherInterface):
-    """Use built in python tools for full text search"""
+    """Use built in python tools for full text search
+
+    Text searches look up candidate notes in an inverted index of words, and
+    regex searches in an index of trigrams, and only read those. Before a
+    search the indexes catch up with the notes, re-reading only the ones
+    whose hash changed. Once the searcher is notified of changes it only
+    checks the notes it was told about, otherwise it checks every note at
+    the cost of a stat each.
+    """
 
     def __init__(self, storage: Storage = None):
         self.storage = storage
         if not self.storage:
             self.storage = Storage()
+        self.index = TextIndex(self.storage.search_index_file())
+        self.trigrams = TrigramIndex(
+            self.storage.trigram_index_file(), self.storage.trigram_postings_file()
+        )
+        self.index_lock = threading.Lock()
+        self.notified = False
+        self.changed: Optional[Set[str]] = None  # None to check every note
 
     def text_search(self, text: str) -> List[str]:
-        return self._search(text, is_regex=False)
+        self._update_indexes()
+        candidates = self.index.candidates(text)
+        notes = self.storage.all_notes() if candidates is None else sorted(candidates)
+        return self._search(text, is_regex=False, notes=notes)
 
     def regex_search(self, pattern: str) -> List[str]:
-        return self._search(pattern, is_regex=True)
+        self._update_indexes()
+        candidates = self.trigrams.candidates(pattern)
+        notes = self.storage.all_notes() if candidates is None else sorted(candidates)
+        return self._search(pattern, is_regex=True, notes=notes)
+
+    def notify(self, notes: Optional[Iterable[str]] = None) -> None:
+        with self.index_lock:
+            self.notified = True
+            if notes is None or self.changed is None:
+                self.changed = None
+            else:
+                self.changed.update(notes)
+
+    def _update_indexes(self) -> None:
+        manifest = self.storage.manifest
+        indexes = (self.index, self.trigrams)
+        with self.index_lock:
+            if self.changed is None:
+                notes = self.storage.all_notes()
+                for index in indexes:
+                    index.remove(index.hashes.keys() - set(notes))
+            else:
+                notes = sorted(self.changed)
+            self.changed = set() if self.notified else None
+            for note in notes:
+                doc_hash = manifest.hash(note)
+                stale = [
+                    index for index in indexes if index.hashes.get(note) != doc_hash
+                ]
+                if not stale:
+                    continue
+                if doc_hash is None:
+                    for index in stale:
+                        index.remove([note])
+                    continue
+                path = self.storage.note_abs_path(note)
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        text = f.read()
+                except FileNotFoundError:
+                    for index in indexes:
+                        index.remove([note])
+                    continue
+                for index in stale:
+                    index.put(note, doc_hash, text)
+            for index in indexes:
+                index.commit()
+        manifest.save()
 
-    def _search(self, query: str, is_regex: bool = True) -> List[str]:
+    def _search(
+        self, query: str, is_regex: bool = True, notes: Iterable[str] = None
+    ) -> List[str]:
         matches = []
-        for file in self.storage.all_notes():
+        for file in self.storage.all_notes() if notes is None else notes:
             if self._search_file(query, file, is_regex):
                 matches.append(file)
         return sorted(relativize_paths(matches, self.storage.root_path))
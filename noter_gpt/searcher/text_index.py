@@ -0,0 +1,190 @@
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional, Set
+
+WORD = re.compile(r"\w+")
+LAST_CHAR = "\U0010ffff"  # sorts after every other character
+
+
+def words_of(text: str) -> Set[str]:
+    return set(WORD.findall(text.casefold()))
+
+
+class TextIndex:
+    """Inverted index from casefolded words to the notes they appear in
+
+    Stored in SQLite, with a postings row per word and note, and the words of
+    every note kept with it. A note is only re-indexed when its content hash
+    changes, and then only the words it gained or lost are written. New
+    postings are collected and inserted in key order on commit, which keeps
+    building the index for a whole notebook fast.
+
+    A substring query is split into words the same way notes are. Where the
+    query has a non-word character next to a word, the word must start or
+    end a word of the note, otherwise it may fall anywhere inside one, and
+    every note containing a match for each query word is a candidate. The
+    candidates are a superset of the matching notes, which callers check.
+    """
+
+    def __init__(self, index_file: str):
+        self.index_file = index_file
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            index_file, timeout=30, check_same_thread=False
+        )
+        self.connection.create_function(
+            "reverse", 1, lambda word: word[::-1], deterministic=True
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS notes (id INTEGER PRIMARY KEY, "
+                "path TEXT UNIQUE NOT NULL, hash TEXT, words TEXT NOT NULL)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS words (id INTEGER PRIMARY KEY, "
+                "word TEXT UNIQUE NOT NULL, reversed TEXT NOT NULL)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS words_by_suffix ON words (reversed)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS postings (word_id INTEGER, note_id "
+                "INTEGER, PRIMARY KEY (word_id, note_id)) WITHOUT ROWID"
+            )
+            self.connection.execute(
+                "CREATE TEMP TABLE new_postings (word TEXT, note_id INTEGER)"
+            )
+        self.hashes: Dict[str, str] = {}
+        self.ids: Dict[str, int] = {}
+        self.paths: Dict[int, str] = {}
+        for note_id, path, hash in self.connection.execute(
+            "SELECT id, path, hash FROM notes"
+        ):
+            self.hashes[path] = hash
+            self.ids[path] = note_id
+            self.paths[note_id] = path
+
+    def put(self, note: str, hash: str, text: str) -> None:
+        """Indexes the note's text, to be committed with `commit`"""
+        new_words = words_of(text)
+        with self.lock:
+            note_id = self.ids.get(note)
+            old_words = set()
+            if note_id is None:
+                note_id = self.connection.execute(
+                    "INSERT INTO notes (path, hash, words) VALUES (?, ?, ?)",
+                    (note, hash, "\n".join(sorted(new_words))),
+                ).lastrowid
+                self.ids[note] = note_id
+                self.paths[note_id] = note
+            else:
+                old_words = self._words_of_note(note_id)
+                self.connection.execute(
+                    "UPDATE notes SET hash = ?, words = ? WHERE id = ?",
+                    (hash, "\n".join(sorted(new_words)), note_id),
+                )
+            self.hashes[note] = hash
+            self._unpost(note_id, old_words - new_words)
+            self.connection.executemany(
+                "INSERT INTO new_postings (word, note_id) VALUES (?, ?)",
+                ((word, note_id) for word in new_words - old_words),
+            )
+
+    def remove(self, notes: Iterable[str]) -> None:
+        with self.lock:
+            for note in notes:
+                note_id = self.ids.pop(note, None)
+                if note_id is None:
+                    continue
+                del self.hashes[note]
+                del self.paths[note_id]
+                self._unpost(note_id, self._words_of_note(note_id))
+                self.connection.execute("DELETE FROM notes WHERE id = ?", (note_id,))
+
+    def _words_of_note(self, note_id: int) -> Set[str]:
+        (words,) = self.connection.execute(
+            "SELECT words FROM notes WHERE id = ?", (note_id,)
+        ).fetchone()
+        return set(words.split("\n")) if words else set()
+
+    def _unpost(self, note_id: int, words: Set[str]) -> None:
+        rows = [(note_id, word) for word in words]
+        self.connection.executemany(
+            "DELETE FROM new_postings WHERE note_id = ? AND word = ?", rows
+        )
+        self.connection.executemany(
+            "DELETE FROM postings WHERE note_id = ? AND word_id = "
+            "(SELECT id FROM words WHERE word = ?)",
+            rows,
+        )
+        # words no longer in any note would only slow down substring lookups
+        self.connection.executemany(
+            "DELETE FROM words WHERE word = ? AND NOT EXISTS "
+            "(SELECT 1 FROM postings WHERE word_id = words.id)",
+            ((word,) for word in words),
+        )
+
+    def commit(self) -> None:
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO words (word, reversed) "
+                "SELECT word, reverse(word) FROM "
+                "(SELECT DISTINCT word FROM new_postings) ORDER BY word"
+            )
+            self.connection.execute(
+                "INSERT OR IGNORE INTO postings (word_id, note_id) "
+                "SELECT words.id, new_postings.note_id "
+                "FROM new_postings JOIN words USING (word) "
+                "ORDER BY words.id, new_postings.note_id"
+            )
+            self.connection.execute("DELETE FROM new_postings")
+            self.connection.commit()
+
+    def close(self) -> None:
+        self.commit()
+        self.connection.close()
+
+    def candidates(self, query: str) -> Optional[Set[str]]:
+        """Notes that may contain the query, or None if it has no words"""
+        query = query.casefold()
+        matches = list(WORD.finditer(query))
+        if not matches:
+            return None
+        with self.lock:
+            note_ids = None
+            # the words inside the query are the most selective, so go first
+            for match in sorted(matches, key=lambda m: self._looseness(query, m)):
+                found = self._notes_with(query, match)
+                note_ids = found if note_ids is None else note_ids & found
+                if not note_ids:
+                    break
+            return {self.paths[note_id] for note_id in note_ids}
+
+    def _looseness(self, query: str, match: re.Match) -> int:
+        return (match.start() == 0) + (match.end() == len(query))
+
+    def _notes_with(self, query: str, match: re.Match) -> Set[int]:
+        word = match.group()
+        starts_word = match.start() > 0
+        ends_word = match.end() < len(query)
+        if starts_word and ends_word:
+            condition, params = "word = ?", (word,)
+        elif starts_word:
+            condition, params = "word >= ? AND word < ?", (word, word + LAST_CHAR)
+        elif ends_word:
+            reversed_word = word[::-1]
+            condition = "reversed >= ? AND reversed < ?"
+            params = (reversed_word, reversed_word + LAST_CHAR)
+        else:
+            condition, params = "instr(word, ?) > 0", (word,)
+        return {
+            note_id
+            for (note_id,) in self.connection.execute(
+                "SELECT DISTINCT note_id FROM postings WHERE word_id IN "
+                f"(SELECT id FROM words WHERE {condition})",
+                params,
+            )
+        }
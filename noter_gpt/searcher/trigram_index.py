@@ -0,0 +1,420 @@
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
+from typing import Union
+
+import numpy as np
+
+try:
+    from re import _parser as sre_parse  # Python 3.11 and later
+except ImportError:
+    import sre_parse
+
+MAX_STRINGS = 16  # most strings tracked for any part of a regex
+REBUILD_FRACTION = 8  # postings are rebuilt once this share of notes changed
+MIN_REBUILD_NOTES = 256
+
+# Folds every character re.IGNORECASE matches with an ASCII character onto
+# the lowercase ASCII one, without changing the length of the text
+FOLD = str.maketrans(
+    {
+        **{chr(c): chr(c).lower() for c in range(ord("A"), ord("Z") + 1)},
+        "İ": "i",  # capital I with dot
+        "ı": "i",  # dotless i
+        "ſ": "s",  # long s
+        "K": "k",  # kelvin sign
+    }
+)
+
+# A query is None to match every note, a trigram id, or ("and" | "or", parts)
+Query = Union[None, int, Tuple[str, list]]
+
+
+def trigram_id(trigram: str) -> int:
+    return (ord(trigram[0]) << 14) | (ord(trigram[1]) << 7) | ord(trigram[2])
+
+
+def trigrams_of(text: str) -> np.ndarray:
+    """Sorted ids of the ASCII trigrams in the folded text"""
+    codes = np.frombuffer(text.translate(FOLD).encode("utf-32-le"), dtype=np.uint32)
+    if len(codes) < 3:
+        return np.zeros(0, dtype=np.uint32)
+    ascii = codes < 128
+    ids = (codes[:-2] << 14) | (codes[1:-1] << 7) | codes[2:]
+    return np.unique(ids[ascii[:-2] & ascii[1:-1] & ascii[2:]])
+
+
+class RegexInfo(NamedTuple):
+    """What is known about the strings a part of a regex matches
+
+    Either the set of `exact` strings, or sets that every match starts and
+    ends with, and in both cases a query every note with a match satisfies.
+    """
+
+    exact: Optional[FrozenSet[str]]
+    prefix: FrozenSet[str]
+    suffix: FrozenSet[str]
+    match: Query
+
+
+EMPTY_STRING = frozenset([""])
+EMPTY = RegexInfo(EMPTY_STRING, EMPTY_STRING, EMPTY_STRING, None)
+ANYTHING = RegexInfo(None, EMPTY_STRING, EMPTY_STRING, None)
+
+
+def regex_query(pattern: str) -> Query:
+    """Trigrams any text matching the regex must contain, None if unknown"""
+    try:
+        parsed = sre_parse.parse(pattern)
+    except (re.error, RecursionError):
+        return None
+    return _query_of(_info_of(parsed))
+
+
+def _and(a: Query, b: Query) -> Query:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return ("and", [a, b])
+
+
+def _strings_query(strings: Iterable[str]) -> Query:
+    alternatives = []
+    for string in strings:
+        if len(string) < 3:
+            return None
+        trigrams = {trigram_id(string[i : i + 3]) for i in range(len(string) - 2)}
+        alternatives.append(("and", sorted(trigrams)))
+    return ("or", alternatives)
+
+
+def _query_of(info: RegexInfo) -> Query:
+    if info.exact is not None:
+        return _and(info.match, _strings_query(info.exact))
+    return _and(
+        info.match,
+        _and(_strings_query(info.prefix), _strings_query(info.suffix)),
+    )
+
+
+def _inexact(info: RegexInfo) -> RegexInfo:
+    if info.exact is None:
+        return info
+    return RegexInfo(None, info.exact, info.exact, info.match)
+
+
+def _simplify(info: RegexInfo) -> RegexInfo:
+    """Keeps the sets small, moving what they tell into the query"""
+    if info.exact is not None:
+        if len(info.exact) <= MAX_STRINGS:
+            return info
+        info = RegexInfo(
+            None,
+            frozenset(s[:2] for s in info.exact),
+            frozenset(s[-2:] for s in info.exact),
+            _and(info.match, _strings_query(info.exact)),
+        )
+    match = info.match
+    prefix = info.prefix
+    if len(prefix) > MAX_STRINGS:
+        match = _and(match, _strings_query(prefix))
+        for length in (2, 1, 0):
+            prefix = frozenset(p[:length] for p in prefix)
+            if len(prefix) <= MAX_STRINGS:
+                break
+    suffix = info.suffix
+    if len(suffix) > MAX_STRINGS:
+        match = _and(match, _strings_query(suffix))
+        for length in (2, 1, 0):
+            suffix = frozenset(s[len(s) - length :] for s in suffix)
+            if len(suffix) <= MAX_STRINGS:
+                break
+    return RegexInfo(None, prefix, suffix, match)
+
+
+def _concat(x: RegexInfo, y: RegexInfo) -> RegexInfo:
+    match = _and(x.match, y.match)
+    if x.exact is not None and y.exact is not None:
+        exact = frozenset(a + b for a in x.exact for b in y.exact)
+        return _simplify(RegexInfo(exact, EMPTY_STRING, EMPTY_STRING, match))
+    if x.exact is not None:
+        prefix = frozenset(a + p for a in x.exact for p in y.prefix)
+    else:
+        prefix = x.prefix
+    if y.exact is not None:
+        suffix = frozenset(s + b for s in x.suffix for b in y.exact)
+    else:
+        suffix = y.suffix
+    if x.exact is None and y.exact is None:
+        # a match has a suffix of x right before a prefix of y
+        if len(x.suffix) * len(y.prefix) <= MAX_STRINGS:
+            joined = (s + p for s in x.suffix for p in y.prefix)
+            match = _and(match, _strings_query(joined))
+        else:
+            match = _and(
+                match, _and(_strings_query(x.suffix), _strings_query(y.prefix))
+            )
+    return _simplify(RegexInfo(None, prefix, suffix, match))
+
+
+def _alternate(infos: List[RegexInfo]) -> RegexInfo:
+    if all(info.exact is not None for info in infos):
+        exact = frozenset().union(*(info.exact for info in infos))
+        matches = [info.match for info in infos]
+        match = None if None in matches else ("or", matches)
+        return _simplify(RegexInfo(exact, EMPTY_STRING, EMPTY_STRING, match))
+    queries = [_query_of(info) for info in infos]
+    infos = [_inexact(info) for info in infos]
+    return _simplify(
+        RegexInfo(
+            None,
+            frozenset().union(*(info.prefix for info in infos)),
+            frozenset().union(*(info.suffix for info in infos)),
+            None if None in queries else ("or", queries),
+        )
+    )
+
+
+def _repeat(info: RegexInfo, least: int, most: int) -> RegexInfo:
+    if most == 0:
+        return EMPTY
+    if least == 0:
+        if most == 1 and info.exact is not None and info.match is None:
+            return _simplify(info._replace(exact=info.exact | EMPTY_STRING))
+        return ANYTHING
+    if least == most == 1:
+        return info
+    # one or more repetitions start, end with and contain a single one
+    return _inexact(info)
+
+
+def _literal(chars: Iterable[str]) -> RegexInfo:
+    folded = frozenset(c.translate(FOLD) for c in chars)
+    # other characters can match more than themselves when ignoring case
+    if any(ord(c) >= 128 for c in folded):
+        return ANYTHING
+    return _simplify(RegexInfo(folded, EMPTY_STRING, EMPTY_STRING, None))
+
+
+def _class_chars(items: list) -> Optional[Set[str]]:
+    chars = set()
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            chars.add(chr(av))
+        elif op is sre_parse.RANGE and av[1] - av[0] < MAX_STRINGS:
+            chars.update(chr(c) for c in range(av[0], av[1] + 1))
+        else:
+            return None
+    return chars
+
+
+def _info_of(parsed) -> RegexInfo:
+    info = EMPTY
+    for op, av in parsed:
+        info = _concat(info, _node_info(op, av))
+    return info
+
+
+def _node_info(op, av) -> RegexInfo:
+    if op is sre_parse.LITERAL:
+        return _literal(chr(av))
+    if op is sre_parse.IN:
+        chars = _class_chars(av)
+        return ANYTHING if chars is None else _literal(chars)
+    if op is sre_parse.SUBPATTERN:
+        return _info_of(av[-1])
+    if op is getattr(sre_parse, "ATOMIC_GROUP", None):
+        return _info_of(av)
+    if op is sre_parse.BRANCH:
+        return _alternate([_info_of(branch) for branch in av[1]])
+    if op in (
+        sre_parse.MAX_REPEAT,
+        sre_parse.MIN_REPEAT,
+        getattr(sre_parse, "POSSESSIVE_REPEAT", None),
+    ):
+        least, most, item = av
+        return _repeat(_info_of(item), least, most)
+    if op is sre_parse.AT:
+        return EMPTY
+    # any character, negated classes, backreferences, lookarounds
+    return ANYTHING
+
+
+class Postings(NamedTuple):
+    paths: np.ndarray  # notes, by row
+    hashes: np.ndarray  # content hash of every note when built
+    keys: np.ndarray  # sorted trigram ids
+    offsets: np.ndarray  # rows of keys[i] are rows[offsets[i]:offsets[i + 1]]
+    rows: np.ndarray
+
+
+class TrigramIndex:
+    """Index from trigrams to the notes containing them, for regex search
+
+    In the style of Google Code Search, a regex is turned into a query of
+    trigrams every match contains, and only the notes satisfying the query
+    need to be scanned with the regex. Trigrams are taken from text folded
+    so the index serves case sensitive and insensitive searches alike.
+
+    The trigrams of every note are kept in SQLite and only extracted again
+    when the note's hash changes. Postings lists for all notes are built from
+    them into a numpy snapshot, which is rebuilt once enough notes changed
+    since. Notes changed since the snapshot are checked against the query
+    directly.
+    """
+
+    def __init__(self, index_file: str, postings_file: str):
+        self.index_file = index_file
+        self.postings_file = postings_file
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            index_file, timeout=30, check_same_thread=False
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS notes (path TEXT PRIMARY KEY, "
+                "hash TEXT NOT NULL, trigrams BLOB NOT NULL)"
+            )
+        self.hashes: Dict[str, str] = dict(
+            self.connection.execute("SELECT path, hash FROM notes")
+        )
+        self.postings = self._load_postings()
+        self.built_hashes: Dict[str, str] = {}
+        if self.postings is not None:
+            self.built_hashes = dict(
+                zip(self.postings.paths.tolist(), self.postings.hashes.tolist())
+            )
+        # trigrams of notes that differ from the snapshot, None once removed
+        self.changed: Dict[str, Optional[FrozenSet[int]]] = {}
+        for note in self.hashes.keys() | self.built_hashes.keys():
+            if self.hashes.get(note) != self.built_hashes.get(note):
+                self.changed[note] = self._stored_trigrams(note)
+
+    def _load_postings(self) -> Optional[Postings]:
+        try:
+            with np.load(self.postings_file) as data:
+                return Postings(*(data[field] for field in Postings._fields))
+        except (FileNotFoundError, OSError, KeyError, ValueError):
+            return None
+
+    def _stored_trigrams(self, note: str) -> Optional[FrozenSet[int]]:
+        row = self.connection.execute(
+            "SELECT trigrams FROM notes WHERE path = ?", (note,)
+        ).fetchone()
+        if row is None:
+            return None
+        return frozenset(np.frombuffer(row[0], dtype=np.uint32).tolist())
+
+    def put(self, note: str, hash: str, text: str) -> None:
+        """Indexes the note's text, to be committed with `commit`"""
+        trigrams = trigrams_of(text)
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO notes (path, hash, trigrams) VALUES (?, ?, ?)",
+                (note, hash, trigrams.tobytes()),
+            )
+            self.hashes[note] = hash
+            if self.built_hashes.get(note) == hash:
+                self.changed.pop(note, None)
+            else:
+                self.changed[note] = frozenset(trigrams.tolist())
+
+    def remove(self, notes: Iterable[str]) -> None:
+        with self.lock:
+            for note in notes:
+                if self.hashes.pop(note, None) is None:
+                    continue
+                self.connection.execute("DELETE FROM notes WHERE path = ?", (note,))
+                if note in self.built_hashes:
+                    self.changed[note] = None
+                else:
+                    self.changed.pop(note, None)
+
+    def commit(self) -> None:
+        with self.lock:
+            self.connection.commit()
+            rebuild_after = max(MIN_REBUILD_NOTES, len(self.hashes) // REBUILD_FRACTION)
+            if len(self.changed) > rebuild_after:
+                self._rebuild()
+
+    def close(self) -> None:
+        self.commit()
+        self.connection.close()
+
+    def _rebuild(self) -> None:
+        paths, hashes, blobs = [], [], []
+        for path, hash, blob in self.connection.execute(
+            "SELECT path, hash, trigrams FROM notes ORDER BY path"
+        ):
+            paths.append(path)
+            hashes.append(hash)
+            blobs.append(np.frombuffer(blob, dtype=np.uint32))
+        lengths = np.array([len(blob) for blob in blobs], dtype=np.int64)
+        trigrams = np.concatenate(blobs) if blobs else np.zeros(0, dtype=np.uint32)
+        rows = np.repeat(np.arange(len(paths), dtype=np.int32), lengths)
+        # stable, so the rows of every trigram stay sorted
+        order = np.argsort(trigrams, kind="stable")
+        keys, starts = np.unique(trigrams[order], return_index=True)
+        self.postings = Postings(
+            np.array(paths, dtype=str),
+            np.array(hashes, dtype=str),
+            keys,
+            np.append(starts, len(order)).astype(np.int64),
+            rows[order],
+        )
+        tmp_file = f"{self.postings_file}.tmp.npz"
+        np.savez(tmp_file, **self.postings._asdict())
+        os.replace(tmp_file, self.postings_file)
+        self.built_hashes = dict(zip(paths, hashes))
+        self.changed = {}
+
+    def candidates(self, pattern: str) -> Optional[Set[str]]:
+        """Notes that may match the regex, or None if every note may"""
+        query = regex_query(pattern)
+        if query is None:
+            return None
+        with self.lock:
+            found = set()
+            if self.postings is not None:
+                paths = self.postings.paths
+                found = {str(paths[row]) for row in self._postings_rows(query)}
+                found -= self.changed.keys()
+            for note, trigrams in self.changed.items():
+                if trigrams is not None and self._satisfies(query, trigrams):
+                    found.add(note)
+            return found
+
+    def _postings_rows(self, query: Query) -> np.ndarray:
+        if isinstance(query, int):
+            keys = self.postings.keys
+            i = np.searchsorted(keys, query)
+            if i == len(keys) or keys[i] != query:
+                return np.zeros(0, dtype=np.int32)
+            offsets = self.postings.offsets
+            return self.postings.rows[offsets[i] : offsets[i + 1]]
+        op, parts = query
+        rows = None
+        for part in parts:
+            part_rows = self._postings_rows(part)
+            if rows is None:
+                rows = part_rows
+            elif op == "and":
+                rows = np.intersect1d(rows, part_rows, assume_unique=True)
+            else:
+                rows = np.union1d(rows, part_rows)
+            if op == "and" and not len(rows):
+                break
+        return rows if rows is not None else np.zeros(0, dtype=np.int32)
+
+    def _satisfies(self, query: Query, trigrams: FrozenSet[int]) -> bool:
+        if isinstance(query, int):
+            return query in trigrams
+        op, parts = query
+        if op == "and":
+            return all(self._satisfies(part, trigrams) for part in parts)
+        return any(self._satisfies(part, trigrams) for part in parts)
@@ -1,25 +1,91 @@
 import os
-from typing import Tuple, List
-from flask import Flask, request, render_template, redirect, url_for
+import json
+from datetime import datetime, timezone
+from typing import Iterator, Optional, Tuple, List
+from flask import (
+    Flask,
+    Response,
+    jsonify,
+    make_response,
+    request,
+    render_template,
+    redirect,
+    url_for,
+)
 
 from noter_gpt.database.inject import VectorDatabaseInterface, inject_database
 from noter_gpt.embedder.inject import inject_embedder
+from noter_gpt.indexer import BackgroundIndexer
+from noter_gpt.manifest import hash_text
 from noter_gpt.searcher.inject import SearcherInterface, inject_searcher
 from noter_gpt.storage import Storage
 from noter_gpt.summarizer.inject import SummarizerInterface, inject_summarizer
+from noter_gpt.summarizer.job_queue import SummaryJob, SummaryJobQueue
+from noter_gpt.watcher.inject import inject_watcher
+
+LONG_POLL_SECONDS = 20.0  # longest a summary request waits before a 202
+OPENAI_SUMMARY_WORKERS = 8  # summaries requested from the API at once
+REVALIDATE = "no-cache"  # cached copies are checked with the ETag every time
+IMMUTABLE = "public, max-age=31536000, immutable"  # for content-versioned URLs
+NOTES_PAGE_SIZE = 200  # notes listed per page by default
+MAX_NOTES_PAGE_SIZE = 1000
 
 app = Flask(__name__)
 
 storage: Storage
 database: VectorDatabaseInterface
 summarizer: SummarizerInterface
+summary_jobs: SummaryJobQueue
 searcher: SearcherInterface
+indexer: BackgroundIndexer
 
 
 @app.route("/")
 def index() -> str:
-    notes = [note for note in storage.all_notes()]
-    return render_template("index.html", notes=notes)
+    # only the first page is rendered, the page fetches the rest as it scrolls
+    prefix = request.args.get("prefix", "")
+    page, has_more = storage.catalog.page(prefix=prefix, limit=NOTES_PAGE_SIZE)
+    notes = [note for note, _ in page]
+    return render_template(
+        "index.html",
+        notes=notes,
+        prefix=prefix,
+        next_cursor=notes[-1] if has_more else None,
+    )
+
+
+@app.route("/notes")
+def list_notes():
+    """Notes sorted by path, a page at a time
+
+    Pass the returned `next_cursor` as `cursor` to get the next page, it is
+    null on the last one. `prefix` limits the listing to paths starting with
+    it, such as a directory followed by a slash.
+    """
+    prefix = request.args.get("prefix", "")
+    cursor = request.args.get("cursor")
+    try:
+        limit = int(request.args.get("limit", NOTES_PAGE_SIZE))
+    except ValueError:
+        return "limit must be a number", 400
+    limit = max(1, min(limit, MAX_NOTES_PAGE_SIZE))
+    page, has_more = storage.catalog.page(prefix=prefix, after=cursor, limit=limit)
+    notes = []
+    for note, _ in page:
+        # the catalog's stat is as old as its last scan, the page's is cheap
+        try:
+            stat = os.stat(storage.note_abs_path(note))
+        except FileNotFoundError:
+            continue
+        notes.append(
+            {
+                "path": note,
+                "url": url_for("note", filename=note),
+                "size": stat.st_size,
+                "mtime": stat.st_mtime_ns / 10**9,
+            }
+        )
+    return jsonify(notes=notes, next_cursor=page[-1][0] if has_more else None)
 
 
 @app.route("/note/<path:filename>", methods=["GET", "POST"])
@@ -29,7 +95,7 @@ def note(filename: str) -> str:
             original_filepath = storage.note_abs_path(filename)
             if os.path.exists(original_filepath):
                 os.remove(original_filepath)
-                database.build_or_update_index()  # Update the index after deletion
+                indexer.notify([filename])  # Update the index after deletion
             return redirect(url_for("index"))
 
         content = request.form["main_content"]
@@ -39,19 +105,22 @@ def note(filename: str) -> str:
         # Save or update the content
         with open(new_filepath, "w") as f:
             f.write(content)
+        indexer.notify([new_filename])
 
         # If the filename has been changed, handle the renaming
         if new_filename != filename:
             original_filepath = os.path.join(storage.root_path, filename)
             if os.path.exists(original_filepath):
                 os.remove(original_filepath)
+                indexer.notify([filename])
 
-        similar_notes = format_similar(content)
+        similar_notes = format_similar(new_filename, content)
 
         return render_template(
             "note.html",
             content=content,
             filename=new_filename,
+            note_hash=hash_text(content),
             similar_notes=similar_notes,
         )
 
@@ -63,36 +132,150 @@ def note(filename: str) -> str:
         else:
             content = ""
 
-        similar_notes = format_similar(content)
+        similar_notes = format_similar(filename, content)
 
         return render_template(
-            "note.html", content=content, filename=filename, similar_notes=similar_notes
+            "note.html",
+            content=content,
+            filename=filename,
+            note_hash=hash_text(content),
+            similar_notes=similar_notes,
         )
 
 
 @app.route("/note-content/<path:filename>")
-def note_content(filename: str) -> str:
-    filepath = storage.note_abs_path(filename)
-    if os.path.exists(filepath):
-        with open(filepath, "r") as f:
-            content = f.read()
-        return content
-    return f"Note for {filename} not found", 404
+def note_content(filename: str):
+    validators = note_validators(filename)
+    if not validators:
+        return f"Note for {filename} not found", 404
+    note_hash, last_modified = validators
+    if not_modified(note_hash, last_modified):
+        return with_validators(("", 304), note_hash, last_modified, REVALIDATE)
+    with open(storage.note_abs_path(filename), "r") as f:
+        content = f.read()
+    return with_validators(content, hash_text(content), last_modified, REVALIDATE)
 
 
 @app.route("/note-summary/<path:filename>")
-def note_summary(filename: str) -> str:
+def note_summary(filename: str):
+    validators = note_validators(filename)
+    if not validators:
+        return f"Note for {filename} not found", 404
+    note_hash, _ = validators
+    # ?v=<content hash> names the exact text summarized, so it never changes
+    version = request.args.get("v")
+    cache_control = IMMUTABLE if version == note_hash else REVALIDATE
+    # validated by ETag alone, the summary's cache key names both the text and
+    # the model while the note's mtime misses model switches and quick saves
+    etag = summarizer.key_for_hash(note_hash)
+    if not_modified(etag):
+        return with_validators(("", 304), etag, None, cache_control)
+    wait = long_poll_seconds()
+    if wait is None:
+        return "wait must be a number", 400
+    with open(storage.note_abs_path(filename), "r", encoding="utf-8") as f:
+        job = summary_jobs.submit(f.read())
+    response = make_response(summary_response(job, wait))
+    if response.status_code != 200:
+        return response
+    if version and job.key != summarizer.key_for_hash(version):
+        cache_control = REVALIDATE  # the note changed since the hash was read
+    return with_validators(response, job.key, None, cache_control)
+
+
+def note_validators(filename: str) -> Optional[Tuple[str, datetime]]:
+    """Content hash and modification time of a note, from a single stat"""
+    hash_and_mtime = storage.manifest.hash_and_mtime(filename)
+    if not hash_and_mtime:
+        return None
+    note_hash, mtime_ns = hash_and_mtime
+    # HTTP dates are whole seconds
+    return note_hash, datetime.fromtimestamp(mtime_ns // 10**9, timezone.utc)
+
+
+def not_modified(etag: str, last_modified: Optional[datetime] = None) -> bool:
+    # If-None-Match takes precedence over If-Modified-Since when both are sent
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    since = request.if_modified_since
+    return since is not None and last_modified is not None and last_modified <= since
+
+
+def with_validators(
+    response, etag: str, last_modified: Optional[datetime], cache_control: str
+) -> Response:
+    response = make_response(response)
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
+@app.route("/note-summary-stream/<path:filename>")
+def note_summary_stream(filename: str) -> Response:
     filepath = storage.note_abs_path(filename)
-    if os.path.exists(filepath):
-        return summarizer.summarize_file(filepath)
-    return f"Note for {filename} not found", 404
+    if not os.path.exists(filepath):
+        return f"Note for {filename} not found", 404
+    with open(filepath, "r", encoding="utf-8") as f:
+        job = summary_jobs.submit(f.read())
+    return Response(server_sent_events(job.stream()), mimetype="text/event-stream")
+
+
+@app.route("/summary-job/<key>")
+def summary_job(key: str):
+    wait = long_poll_seconds()
+    if wait is None:
+        return "wait must be a number", 400
+    job = summary_jobs.get(key)
+    if job:
+        return summary_response(job, wait)
+    return f"Summary job {key} not found", 404
+
+
+def long_poll_seconds() -> Optional[float]:
+    """The `wait` parameter, capped at LONG_POLL_SECONDS, or None if invalid"""
+    try:
+        wait = float(request.args.get("wait", LONG_POLL_SECONDS))
+    except ValueError:
+        return None
+    return max(0.0, min(wait, LONG_POLL_SECONDS))
+
+
+def summary_response(job: SummaryJob, wait: float):
+    """The summary once it is done, or 202 and where to ask again"""
+    if not job.wait(wait):
+        status_url = url_for("summary_job", key=job.key)
+        return (
+            jsonify(status="pending", status_url=status_url),
+            202,
+            {"Location": status_url, "Retry-After": "1"},
+        )
+    if job.error:
+        return f"Summarizing failed: {job.error}", 500
+    return job.summary()
+
+
+def server_sent_events(pieces: Iterator[str]) -> Iterator[str]:
+    # JSON keeps newlines inside a piece from ending the event
+    for piece in pieces:
+        yield f"data: {json.dumps(piece)}\n\n"
+    yield "event: done\ndata: \n\n"
+
+
+@app.route("/summary-cache-stats")
+def summary_cache_stats():
+    return jsonify(summarizer.cache.statistics())
 
 
 @app.route("/text-summary", methods=["POST"])
-def text_summary() -> str:
+def text_summary():
+    wait = long_poll_seconds()
+    if wait is None:
+        return "wait must be a number", 400
     data = request.get_json()
     text = data["text"]
-    return summarizer.summarize_text(text)
+    return summary_response(summary_jobs.submit(text), wait)
 
 
 @app.route("/search-full-text")
@@ -105,10 +288,8 @@ def search_full_text() -> str:
         return redirect(url_for("index"))
 
 
-def format_similar(content: str) -> List[Tuple[str, str]]:
-    # Rebuild or update the index after updating the note
-    database.build_or_update_index()
-    similar_notes = database.find_similar(content, n=5)
+def format_similar(filename: str, content: str) -> List[Tuple[str, str]]:
+    similar_notes = database.find_similar_to_note(filename, content, n=5)
     formatted_similar_notes = [
         (name, f"{similarity:.3f}") for name, similarity in similar_notes
     ]
@@ -127,15 +308,26 @@ def run_server(use_openai: bool = False) -> None:
     database = inject_database(
         storage=storage, embedder=inject_embedder(use_openai=use_openai)
     )
+    watcher = inject_watcher(storage=storage)
     database.build_or_update_index()
 
+    # Keep the index up to date in the background
+    global indexer
+    indexer = BackgroundIndexer(database=database, watcher=watcher)
+    indexer.start()
+
     # Initialize the Summarizer
     global summarizer
     summarizer = inject_summarizer(storage=storage, use_openai=use_openai)
+    global summary_jobs
+    summary_jobs = SummaryJobQueue(
+        summarizer, workers=OPENAI_SUMMARY_WORKERS if use_openai else 1
+    )
 
     # Initialize the Searcher
     global searcher
     searcher = inject_searcher(storage=storage)
+    indexer.subscribe(searcher.notify)
 
     app.run(debug=True, use_reloader=False, port=31337)
 
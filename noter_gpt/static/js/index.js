@@ -0,0 +1,60 @@
+function noteMatchesFilter(note) {
+  const regex_pattern = document.getElementById('regex_pattern').value;
+  return note.innerText.match(new RegExp(regex_pattern, 'i'));
+}
+
+function filterNotes() {
+  const notes = document.getElementsByClassName('note');
+  for (let i = 0; i < notes.length; i++) {
+    notes[i].style.display = noteMatchesFilter(notes[i]) ? '' : 'none';
+  }
+}
+
+function loadNotesOnScroll(marker) {
+  // fetch the next page whenever the marker below the list comes into view
+  let loading = false;
+  const observer = new IntersectionObserver(entries => {
+    if (loading || !entries.some(entry => entry.isIntersecting)) {
+      return;
+    }
+    loading = true;
+    const params = new URLSearchParams({
+      cursor: marker.dataset.cursor,
+      prefix: marker.dataset.prefix,
+    });
+    fetch('/notes?' + params)
+      .then(response => response.json())
+      .then(page => {
+        appendNotes(page.notes);
+        if (page.next_cursor) {
+          marker.dataset.cursor = page.next_cursor;
+          // the marker may still be in view, so look again
+          observer.unobserve(marker);
+          observer.observe(marker);
+        } else {
+          observer.disconnect();
+          marker.remove();
+        }
+        loading = false;
+      })
+      .catch(error => {
+        console.error('Fetch error:', error);
+        loading = false;
+      });
+  });
+  observer.observe(marker);
+}
+
+function appendNotes(notes) {
+  const list = document.getElementById('notes');
+  for (const note of notes) {
+    const item = document.createElement('li');
+    item.className = 'note';
+    const link = document.createElement('a');
+    link.href = note.url;
+    link.innerText = note.path;
+    item.appendChild(link);
+    item.style.display = noteMatchesFilter(link) ? '' : 'none';
+    list.appendChild(item);
+  }
+}
@@ -1,46 +1,75 @@
 function viewSideBySide(similarNote) {
   fetch('/note-content/' + similarNote)
-    .then(response => response.text())
-    .then(data => {
+    .then(response => {
+      // the ETag is the note's content hash, which versions its summary
+      const version = (response.headers.get('ETag') || '').replaceAll('"', '');
+      return response.text().then(data => [data, version]);
+    })
+    .then(([data, version]) => {
       document.getElementById('similar_content').innerText = data;
       document.getElementById('similar_content_wrapper').style.display = 'flex';
-      summarizeFile(similarNote, 'similar_content_summary', true)
+      summarizeFile(similarNote, 'similar_content_summary', true, version)
     });
 }
 
-let fetchController;
+let summaryStream;
+let similarSummaryRequest = 0;
 
-function summarizeFile(filename, targetId, checkChanged = false) {
-  document.getElementById(targetId).innerText = "";
-  document.getElementById(targetId).parentNode.ariaBusy = true;
-
-  const fetchOptions = {
-    method: 'GET',
-    headers: {
-      'Accept': 'application/json',
-    },
-  };
+function summarizeFile(filename, targetId, checkChanged = false, version = null) {
+  const target = document.getElementById(targetId);
+  target.innerText = "";
+  target.parentNode.ariaBusy = true;
 
+  let request = 0;
   if (checkChanged) {
-    if (fetchController) {
-      fetchController.abort(); // cancel previous request if necessary
+    if (summaryStream) {
+      summaryStream.close(); // cancel previous request if necessary
+      summaryStream = null;
     }
-    fetchController = new AbortController();
-    fetchOptions.signal = fetchController.signal;
+    request = ++similarSummaryRequest;
   }
+  const isCurrent = () => !checkChanged || request === similarSummaryRequest;
 
-  fetch('/note-summary/' + filename, fetchOptions)
-    .then(response => response.text())
+  if (!version) {
+    streamSummary(filename, target, checkChanged);
+    return;
+  }
+  // the summary of a given version never changes, so the browser may have it
+  fetch('/note-summary/' + filename + '?wait=0&v=' + version)
+    .then(response => response.status === 200 ? response.text() : null)
     .then(summary => {
-      document.getElementById(targetId).innerText = summary;
-      document.getElementById(targetId).parentNode.ariaBusy = false;
-    }).catch(error => {
-      if (error.name === 'AbortError') {
-        console.log('Fetch aborted');
-      } else {
-        console.error('Fetch error:', error);
+      if (!isCurrent()) {
+        return;
       }
-    });
+      if (summary === null) {
+        streamSummary(filename, target, checkChanged);
+        return;
+      }
+      target.innerText = summary;
+      target.parentNode.ariaBusy = false;
+    })
+    .catch(error => console.error('Fetch error:', error));
+}
+
+function streamSummary(filename, target, checkChanged) {
+  // stream the summary in as it is generated
+  const source = new EventSource('/note-summary-stream/' + filename);
+  if (checkChanged) {
+    summaryStream = source;
+  }
+
+  source.onmessage = event => {
+    target.innerText += JSON.parse(event.data);
+  };
+  source.addEventListener('done', () => {
+    source.close();
+    target.parentNode.ariaBusy = false;
+  });
+  source.onerror = error => {
+    source.close();
+    target.parentNode.ariaBusy = false;
+    console.error('Summary stream error:', error);
+  };
 }
 
 function extractTextFromElementById(id) {
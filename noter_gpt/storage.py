@@ -1,5 +1,9 @@
 import os
 from typing import List
+from functools import cached_property
+
+from noter_gpt.catalog import NoteCatalog
+from noter_gpt.manifest import NoteManifest
 
 DEFAULT_CACHE_DIR = ".notes/"
 
@@ -34,27 +38,57 @@ class Storage:
         os.makedirs(self.cache_path, exist_ok=True)
 
     def embedding_cache_file(self, identifier: str) -> str:
-        return os.path.join(self.cache_path, f"embedding_hashes_{identifier}.json")
+        return os.path.join(self.cache_path, f"embeddings_{identifier}.json")
+
+    def embedding_matrix_file(self, identifier: str) -> str:
+        return os.path.join(self.cache_path, f"embeddings_{identifier}.f32")
+
+    def passage_cache_file(self, identifier: str) -> str:
+        return os.path.join(self.cache_path, f"passages_{identifier}.json")
+
+    def passage_matrix_file(self, identifier: str) -> str:
+        return os.path.join(self.cache_path, f"passages_{identifier}.f32")
+
+    def passage_refs_file(self, identifier: str) -> str:
+        return os.path.join(self.cache_path, f"passage_refs_{identifier}.json")
 
     def built_index_file(self, identifier: str) -> str:
         return os.path.join(self.cache_path, f"index_{identifier}.ann")
 
+    def built_index_items_file(self, identifier: str) -> str:
+        return os.path.join(self.cache_path, f"index_{identifier}.json")
+
+    def knn_graph_file(self, identifier: str) -> str:
+        return os.path.join(self.cache_path, f"knn_graph_{identifier}.npz")
+
     def summary_cache_file(self) -> str:
         return os.path.join(self.cache_path, "file_summaries.json")
 
+    def summary_database_file(self) -> str:
+        return os.path.join(self.cache_path, "summaries.sqlite3")
+
+    def search_index_file(self) -> str:
+        return os.path.join(self.cache_path, "search_index.sqlite3")
+
+    def trigram_index_file(self) -> str:
+        return os.path.join(self.cache_path, "trigrams.sqlite3")
+
+    def trigram_postings_file(self) -> str:
+        return os.path.join(self.cache_path, "trigram_postings.npz")
+
+    def note_manifest_file(self) -> str:
+        return os.path.join(self.cache_path, "note_manifest.json")
+
+    @cached_property
+    def manifest(self) -> NoteManifest:
+        return NoteManifest(self.note_manifest_file(), self.root_path)
+
+    @cached_property
+    def catalog(self) -> NoteCatalog:
+        return NoteCatalog(self.root_path)
+
     def all_notes(self) -> List[str]:
-        all_note_paths = []
-        for root, dirs, notes in os.walk(self.root_path):
-            notes = [
-                os.path.join(root, f)
-                for f in notes
-                if not f[0] == "." and f.endswith(".txt")
-            ]
-            dirs[:] = [d for d in dirs if not d[0] == "."]
-            for note in notes:
-                relative_path = os.path.relpath(note, self.root_path)
-                all_note_paths.append(relative_path)
-        return sorted(all_note_paths)
+        return self.catalog.notes()
 
     def note_abs_path(self, note: str) -> str:
         return os.path.join(self.root_path, note)
@@ -1,25 +1,25 @@
-from multiprocessing.pool import ThreadPool
-
 from tqdm import tqdm
 
 from noter_gpt.storage import Storage
 from noter_gpt.summarizer.interface import SummarizerInterface
 
+NOTES_PER_BATCH = 32  # notes whose chunks are summarized together
+API_NOTES_PER_BATCH = 1000  # notes whose requests are sent concurrently
+
 
 class BatchSummarizer:
     def __init__(self, summarizer: SummarizerInterface, storage: Storage = None):
         self.summarizer = summarizer
         self.storage = storage if storage else Storage()
 
-    def summarize_all_notes(self) -> None:
-        for file in tqdm(self.storage.all_notes()):
-            self.summarizer.summarize_file(file)
-
-    def parallel_summarize_all_notes(self) -> None:
-        def worker(note):
-            return self.summarizer.summarize_file(note)
-
-        with ThreadPool() as pool:
-            notes = list(self.storage.all_notes())
-            for _ in tqdm(pool.imap(worker, notes), total=len(notes)):
-                pass
+    def summarize_all_notes(self, notes_per_batch: int = NOTES_PER_BATCH) -> None:
+        notes = self.storage.all_notes()
+        with tqdm(total=len(notes)) as progress:
+            for start in range(0, len(notes), notes_per_batch):
+                batch = notes[start : start + notes_per_batch]
+                texts = []
+                for note in batch:
+                    with open(note, "r", encoding="utf-8") as file:
+                        texts.append(file.read())
+                self.summarizer.summarize_texts(texts)
+                progress.update(len(batch))
@@ -0,0 +1,173 @@
+import os
+import json
+import atexit
+import sqlite3
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, Optional
+
+MEMORY_BUDGET_BYTES = 16 * 1024 * 1024  # summaries kept in memory, by size
+FLUSH_COUNT = 32  # pending summaries that trigger a commit
+FLUSH_SECONDS = 2.0  # longest a summary waits before it is committed
+STATS = ("hits", "misses", "evictions", "bytes_saved")
+
+
+def summary_bytes(summary: str) -> int:
+    return len(summary.encode("utf-8"))
+
+
+class SummaryCache:
+    """Summaries stored in SQLite, with recently used ones kept in memory
+
+    The database runs in WAL mode so several processes can read and write it
+    at once, and lookups only read the rows they need. New summaries are
+    collected in memory and committed together once enough are pending or a
+    short timer runs out, and on exit.
+
+    The memory front evicts the least recently used summaries once their
+    total size exceeds `memory_budget_bytes`. Hits, misses, evictions and the
+    bytes served from the cache are counted and added to running totals in
+    the database on every commit.
+    """
+
+    def __init__(
+        self,
+        database_file: str,
+        legacy_json_file: str = None,
+        memory_budget_bytes: int = MEMORY_BUDGET_BYTES,
+    ):
+        self.database_file = database_file
+        self.memory_budget_bytes = memory_budget_bytes
+        self.lock = threading.RLock()
+        self.front: OrderedDict[str, str] = OrderedDict()  # least recent first
+        self.front_bytes = 0
+        self.pending: Dict[str, str] = {}
+        self.stats = Counter()  # counted by this process
+        self.pending_stats = Counter()  # not yet added to the totals
+        self.timer: threading.Timer = None
+        self.connection = sqlite3.connect(
+            database_file, timeout=30, check_same_thread=False
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS summaries "
+                "(key TEXT PRIMARY KEY, summary TEXT NOT NULL)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS stats "
+                "(name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+        if legacy_json_file:
+            self._import_json(legacy_json_file)
+        atexit.register(self.flush)
+
+    def _import_json(self, json_file: str) -> None:
+        """Moves summaries from the old JSON cache file into the database"""
+        try:
+            with open(json_file, "r") as f:
+                summaries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO summaries (key, summary) VALUES (?, ?)",
+                summaries.items(),
+            )
+        os.replace(json_file, f"{json_file}.imported")
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            summary = self.pending.get(key, self.front.get(key))
+            if summary is None:
+                row = self.connection.execute(
+                    "SELECT summary FROM summaries WHERE key = ?", (key,)
+                ).fetchone()
+                summary = row[0] if row else None
+            if summary is None:
+                self._count("misses")
+                return None
+            self._remember(key, summary)
+            self._count("hits")
+            self._count("bytes_saved", summary_bytes(summary))
+            return summary
+
+    def put(self, key: str, summary: str) -> None:
+        with self.lock:
+            self.pending[key] = summary
+            self._remember(key, summary)
+            if len(self.pending) >= FLUSH_COUNT:
+                self.flush()
+            elif self.timer is None:
+                self.timer = threading.Timer(FLUSH_SECONDS, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def _remember(self, key: str, summary: str) -> None:
+        if key in self.front:
+            self.front.move_to_end(key)
+            return
+        self.front[key] = summary
+        self.front_bytes += summary_bytes(summary)
+        while self.front_bytes > self.memory_budget_bytes and len(self.front) > 1:
+            _, evicted = self.front.popitem(last=False)
+            self.front_bytes -= summary_bytes(evicted)
+            self._count("evictions")
+
+    def _count(self, stat: str, amount: int = 1) -> None:
+        self.stats[stat] += amount
+        self.pending_stats[stat] += amount
+
+    def flush(self) -> None:
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.pending and not self.pending_stats:
+                return
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO summaries (key, summary) VALUES (?, ?)",
+                    self.pending.items(),
+                )
+                self.connection.executemany(
+                    "INSERT INTO stats (name, value) VALUES (?, ?) "
+                    "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+                    self.pending_stats.items(),
+                )
+            self.pending = {}
+            self.pending_stats = Counter()
+
+    def close(self) -> None:
+        self.flush()
+        atexit.unregister(self.flush)
+        self.connection.close()
+
+    def statistics(self) -> Dict[str, Dict[str, int]]:
+        """Counters of this process, running totals, and the cache's size"""
+        with self.lock:
+            self.flush()
+            totals = dict(self.connection.execute("SELECT name, value FROM stats"))
+            entries, stored_bytes = self.connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(summary AS BLOB))), 0) "
+                "FROM summaries"
+            ).fetchone()
+            return {
+                "process": {stat: self.stats[stat] for stat in STATS},
+                "total": {stat: totals.get(stat, 0) for stat in STATS},
+                "size": {
+                    "entries": entries,
+                    "bytes": stored_bytes,
+                    "memory_entries": len(self.front),
+                    "memory_bytes": self.front_bytes,
+                    "memory_budget_bytes": self.memory_budget_bytes,
+                },
+            }
+
+    def __len__(self) -> int:
+        with self.lock:
+            self.flush()
+            return self.connection.execute("SELECT COUNT(*) FROM summaries").fetchone()[
+                0
+            ]
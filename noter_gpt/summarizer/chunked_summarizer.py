@@ -0,0 +1,112 @@
+import re
+import hashlib
+from abc import abstractmethod
+from typing import Dict, Iterator, List
+
+from noter_gpt.summarizer.util import chunk_paragraphs
+from noter_gpt.summarizer.interface import SummarizerInterface
+from noter_gpt.summarizer.constants import MAX_SUMMARY_LENGTH_WORDS
+
+MAP_BATCH_SIZE = 8  # chunks sent through the model at once
+
+
+class ChunkedSummarizer(SummarizerInterface):
+    """Summarizes text in chunks, then summarizes the joined chunk summaries
+
+    Every chunk summary, at every level, is cached by the hash of the chunk,
+    and chunk boundaries are chosen by content so they stay put across edits.
+    Editing one part of a long text only re-runs the chunk it falls in and
+    the chunks above it that summarize its summary.
+
+    Texts are summarized a level at a time, and the uncached chunks of a
+    level, across every text being summarized, go through the model in
+    batches of `batch_size`. When streaming, the levels below the last run
+    as usual and the last one, a single chunk, is streamed. That relies on
+    chunk summaries being short enough, so subclasses cap their length at
+    `max_summary_words`.
+    """
+
+    max_summary_words = MAX_SUMMARY_LENGTH_WORDS
+    batch_size = MAP_BATCH_SIZE
+
+    def _summarize(self, text: str, _: str = None) -> str:
+        return self._summarize_all([text])[0]
+
+    def _summarize_all(self, texts: List[str]) -> List[str]:
+        summaries = list(texts)
+        pending = list(range(len(texts)))
+        while pending:
+            chunks = {
+                i: list(chunk_paragraphs(summaries[i], self._chunk_size()))
+                for i in pending
+            }
+            chunk_summaries = self._summarize_chunks_cached(
+                [chunk for text_chunks in chunks.values() for chunk in text_chunks]
+            )
+            next_pending = []
+            for i, text_chunks in chunks.items():
+                concatenated_summary = "\n\n".join(
+                    chunk_summaries[chunk] for chunk in text_chunks
+                )
+                summaries[i] = concatenated_summary
+                if not self._short_enough(concatenated_summary):
+                    next_pending.append(i)
+            pending = next_pending
+        return summaries
+
+    def _stream_summarize(self, text: str, _: str = None) -> Iterator[str]:
+        while True:
+            chunks = list(chunk_paragraphs(text, self._chunk_size()))
+            key = self._chunk_key(chunks[0]) if len(chunks) == 1 else None
+            if key and self._get_from_cache(key) is None:
+                # a single chunk's summary is capped, so it is the final one
+                pieces = []
+                for piece in self._stream_summarize_chunk(chunks[0]):
+                    pieces.append(piece)
+                    yield piece
+                self._add_to_cache(key, "".join(pieces))
+                return
+            chunk_summaries = self._summarize_chunks_cached(chunks)
+            text = "\n\n".join(chunk_summaries[chunk] for chunk in chunks)
+            if self._short_enough(text):
+                yield text
+                return
+
+    def _short_enough(self, summary: str) -> bool:
+        return len(re.findall(r"\w+", summary)) <= self.max_summary_words
+
+    def _summarize_chunks_cached(self, chunks: List[str]) -> Dict[str, str]:
+        summaries = {}
+        for chunk in chunks:
+            if chunk not in summaries:
+                summaries[chunk] = self._get_from_cache(self._chunk_key(chunk))
+        # similar lengths in a batch keep padding small
+        missing = sorted((c for c, s in summaries.items() if s is None), key=len)
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start : start + self.batch_size]
+            for chunk, summary in zip(batch, self._summarize_chunks(batch)):
+                self._add_to_cache(self._chunk_key(chunk), summary)
+                summaries[chunk] = summary
+        return summaries
+
+    def _stream_summarize_chunk(self, chunk: str) -> Iterator[str]:
+        """Should yield pieces of the chunk's summary as they are generated"""
+        yield self._summarize_chunk(chunk)
+
+    def _summarize_chunks(self, chunks: List[str]) -> List[str]:
+        """Should return a summary of every chunk, one model call per batch"""
+        return [self._summarize_chunk(chunk) for chunk in chunks]
+
+    def _chunk_key(self, chunk: str) -> str:
+        hash = hashlib.md5(chunk.encode("utf-8")).hexdigest()
+        return f"{self._cache_model_key()}__chunk__{hash}"
+
+    @abstractmethod
+    def _chunk_size(self) -> int:
+        """Should return the largest chunk in characters the model can take"""
+        pass
+
+    @abstractmethod
+    def _summarize_chunk(self, chunk: str) -> str:
+        """Should return a summary of a single chunk, short enough to be final"""
+        pass
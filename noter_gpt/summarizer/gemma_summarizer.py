@@ -1,43 +1,63 @@
-import re
+from typing import Iterator, List
 
-from transformers import AutoTokenizer, AutoModelForCausalLM
+from transformers import AutoTokenizer, AutoModelForCausalLM, TextIteratorStreamer
 
 from noter_gpt.storage import Storage
-from noter_gpt.summarizer.util import chunk_text
-from noter_gpt.summarizer.interface import SummarizerInterface
-from noter_gpt.summarizer.constants import (
-    MAX_SUMMARY_LENGTH_WORDS,
-)
+from noter_gpt.summarizer.chunked_summarizer import MAP_BATCH_SIZE, ChunkedSummarizer
+from noter_gpt.summarizer.util import stream_generation
 
 MAX_LOCAL_INPUT_CHARS = 4000
 
 
-class GemmaSummarizer(SummarizerInterface):
-    def __init__(self, storage: Storage = None, model_name: str = "google/gemma-2b"):
+class GemmaSummarizer(ChunkedSummarizer):
+    def __init__(
+        self,
+        storage: Storage = None,
+        model_name: str = "google/gemma-2b",
+        batch_size: int = MAP_BATCH_SIZE,
+    ):
         super().__init__(storage=storage)
         self.model_name = model_name
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        self.batch_size = batch_size
+        # prompts are padded on the left so every row generates from its end
+        self.tokenizer = AutoTokenizer.from_pretrained(
+            self.model_name, padding_side="left"
+        )
         self.model = AutoModelForCausalLM.from_pretrained(
             self.model_name, device_map="auto"
         )
 
-    def _summarize(self, text: str, _: str = None) -> str:
-        chunks = chunk_text(text, MAX_LOCAL_INPUT_CHARS)
-        summaries = []
-        for chunk in chunks:
-            summary = self._summarize_chunk(chunk)
-            summaries.append(summary)
-        concatenated_summary = "\n\n".join(summaries)
-        if len(re.split(r"\W+", concatenated_summary)) <= MAX_SUMMARY_LENGTH_WORDS:
-            return concatenated_summary
-        return self._summarize(concatenated_summary, _)
+    def _inputs(self, chunks: List[str]):
+        input_texts = [f"Summarize the following text:\n\n{chunk}" for chunk in chunks]
+        return self.tokenizer(input_texts, return_tensors="pt", padding=True).to(
+            self.model.device
+        )
+
+    def _chunk_size(self) -> int:
+        return MAX_LOCAL_INPUT_CHARS
 
     def _summarize_chunk(self, chunk: str) -> str:
-        input_text = f"Summarize the following text:\n\n{chunk}"
-        input_ids = self.tokenizer(input_text, return_tensors="pt").to("cuda")
+        return self._summarize_chunks([chunk])[0]
+
+    def _stream_summarize_chunk(self, chunk: str) -> Iterator[str]:
+        streamer = TextIteratorStreamer(
+            self.tokenizer, skip_prompt=True, skip_special_tokens=True
+        )
+        return stream_generation(
+            streamer,
+            self.model.generate,
+            **self._inputs([chunk]),
+            max_new_tokens=self.max_summary_words,
+        )
+
+    def _summarize_chunks(self, chunks: List[str]) -> List[str]:
+        inputs = self._inputs(chunks)
 
-        outputs = self.model.generate(**input_ids)
-        return self.tokenizer.decode(outputs[0])
+        # every word takes a token at least, so capping the tokens keeps each
+        # chunk summary short enough to be final, as streaming expects
+        outputs = self.model.generate(**inputs, max_new_tokens=self.max_summary_words)
+        generated = outputs[:, inputs["input_ids"].shape[1] :]
+        return self.tokenizer.batch_decode(generated, skip_special_tokens=True)
 
     def _cache_model_key(self) -> str:
         return f"LOCAL_{self.model_name}"
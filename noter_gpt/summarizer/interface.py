@@ -1,11 +1,11 @@
+import os
 import hashlib
-import json
 
 from abc import ABC, abstractmethod
+from typing import Iterator, List, Optional
 
 from noter_gpt.storage import Storage
-
-CACHE_SIZE = 1000
+from noter_gpt.summarizer.cache import MEMORY_BUDGET_BYTES, SummaryCache
 
 
 class SummarizerInterface(ABC):
@@ -16,32 +16,27 @@ class SummarizerInterface(ABC):
         if not self.storage:
             self.storage = Storage()
 
-        self.cache = self._load_cache()
-
-    def _load_cache(self) -> None:
-        try:
-            with open(self.storage.summary_cache_file(), "r") as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return {}
-
-    def _save_cache(self) -> None:
-        with open(self.storage.summary_cache_file(), "w+") as f:
-            json.dump(self.cache, f)
+        self.cache = SummaryCache(
+            self.storage.summary_database_file(),
+            legacy_json_file=self.storage.summary_cache_file(),
+            memory_budget_bytes=int(
+                os.environ.get("NOTER_SUMMARY_CACHE_BYTES", MEMORY_BUDGET_BYTES)
+            ),
+        )
 
     def _get_key(self, text: str, context: str = None) -> str:
         total_text = text + context if context else text
-        hash = hashlib.md5(total_text.encode("utf-8")).hexdigest()
-        return f"{self._cache_model_key()}__{hash}"
+        return self.key_for_hash(hashlib.md5(total_text.encode("utf-8")).hexdigest())
+
+    def key_for_hash(self, text_hash: str) -> str:
+        """The cache key of the summary of a text with the given md5 hash"""
+        return f"{self._cache_model_key()}__{text_hash}"
 
     def _get_from_cache(self, key: str) -> str:
         return self.cache.get(key)
 
     def _add_to_cache(self, key: str, value: str) -> None:
-        if len(self.cache) >= CACHE_SIZE:
-            self.cache.pop(next(iter(self.cache)))
-        self.cache[key] = value
-        self._save_cache()
+        self.cache.put(key, value)
 
     def summarize_text(self, text: str, context: str = None) -> str:
         text_hash = self._get_key(text, context)
@@ -53,6 +48,59 @@ class SummarizerInterface(ABC):
             self._add_to_cache(text_hash, summary)
             return summary
 
+    def stream_summarize_text(self, text: str, context: str = None) -> Iterator[str]:
+        """Yields the summary in pieces as it is generated, then caches it"""
+        text_hash = self._get_key(text, context)
+        cached_summary = self._get_from_cache(text_hash)
+        if cached_summary:
+            yield cached_summary
+            return
+        yield from self.stream_uncached_summary(text_hash, text, context)
+
+    def stream_uncached_summary(
+        self, key: str, text: str, context: str = None
+    ) -> Iterator[str]:
+        """Like stream_summarize_text, for callers that already missed the cache"""
+        pieces = []
+        for piece in self._stream_summarize(text, context):
+            pieces.append(piece)
+            yield piece
+        self._add_to_cache(key, "".join(pieces))
+
+    def stream_summarize_file(
+        self, filepath: str, context: str = None
+    ) -> Iterator[str]:
+        with open(filepath, "r", encoding="utf-8") as file:
+            text = file.read()
+        return self.stream_summarize_text(text, context)
+
+    def _stream_summarize(self, text: str, context: str = None) -> Iterator[str]:
+        """Should yield pieces of the summary as they are generated"""
+        yield self._summarize(text, context)
+
+    def summarize_texts(self, texts: List[str]) -> List[Optional[str]]:
+        """Summarizes many texts, batching model calls where possible
+
+        Texts that failed to summarize get None instead of a summary.
+        """
+        keys = [self._get_key(text) for text in texts]
+        summaries = [self._get_from_cache(key) for key in keys]
+        uncached = [i for i, summary in enumerate(summaries) if not summary]
+        new_summaries = self._summarize_all([texts[i] for i in uncached])
+        for i, summary in zip(uncached, new_summaries):
+            if summary is not None:
+                self._add_to_cache(keys[i], summary)
+            summaries[i] = summary
+        return summaries
+
+    def _summarize_all(self, texts: List[str]) -> List[Optional[str]]:
+        """Summarizes texts that aren't cached, subclasses may batch the calls
+
+        Subclasses that summarize texts independently may return None for the
+        ones that failed, so the others are still cached.
+        """
+        return [self._summarize(text) for text in texts]
+
     def summarize_file(self, filepath: str, context: str = None) -> str:
         with open(filepath, "r", encoding="utf-8") as file:
             text = file.read()
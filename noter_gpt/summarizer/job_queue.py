@@ -0,0 +1,121 @@
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from noter_gpt.summarizer.interface import SummarizerInterface
+
+WORKERS = 1  # summaries generated at once, local models share the cores
+FINISHED_JOBS = 256  # finished jobs kept so their status can still be read
+
+logger = logging.getLogger(__name__)
+
+
+class SummaryJob:
+    """A summary being generated, read by every request that asked for it"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.pieces: List[str] = []
+        self.error: Optional[Exception] = None
+        self.done = False
+        self.condition = threading.Condition()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Returns whether the job finished within `timeout` seconds"""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.done, timeout)
+
+    def summary(self) -> str:
+        with self.condition:
+            return "".join(self.pieces)
+
+    def stream(self) -> Iterator[str]:
+        """Yields the pieces generated so far, then the rest as they come in"""
+        seen = 0
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: len(self.pieces) > seen or self.done)
+                pieces = self.pieces[seen:]
+                done = self.done
+            seen += len(pieces)
+            yield from pieces
+            if done:
+                if self.error:
+                    raise self.error
+                return
+
+    def _append(self, piece: str) -> None:
+        with self.condition:
+            self.pieces.append(piece)
+            self.condition.notify_all()
+
+    def _finish(self, error: Exception = None) -> None:
+        with self.condition:
+            self.error = error
+            self.done = True
+            self.condition.notify_all()
+
+
+class SummaryJobQueue:
+    """Generates summaries on a bounded pool of worker threads
+
+    Jobs are keyed by the summary's cache key, and asking for a summary that
+    is already being generated joins the running job instead of starting
+    another, so the model runs once per distinct text however many requests
+    ask for it. Cached summaries come back as finished jobs right away.
+    """
+
+    def __init__(self, summarizer: SummarizerInterface, workers: int = WORKERS):
+        self.summarizer = summarizer
+        self.executor = ThreadPoolExecutor(
+            workers, thread_name_prefix="noter-summarizer"
+        )
+        self.lock = threading.Lock()
+        self.running: Dict[str, SummaryJob] = {}
+        self.finished: OrderedDict[str, SummaryJob] = OrderedDict()
+
+    def submit(self, text: str, context: str = None) -> SummaryJob:
+        key = self.summarizer._get_key(text, context)
+        with self.lock:
+            job = self.running.get(key) or self._cached(key)
+            if job:
+                return job
+            job = SummaryJob(key)
+            self.running[key] = job
+        self.executor.submit(self._run, job, text, context)
+        return job
+
+    def get(self, key: str) -> Optional[SummaryJob]:
+        with self.lock:
+            return self.running.get(key) or self.finished.get(key) or self._cached(key)
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def _cached(self, key: str) -> Optional[SummaryJob]:
+        summary = self.summarizer._get_from_cache(key)
+        if summary is None:
+            return None
+        job = SummaryJob(key)
+        job._append(summary)
+        job._finish()
+        return job
+
+    def _run(self, job: SummaryJob, text: str, context: str) -> None:
+        error = None
+        try:
+            # submit already missed the cache, a second lookup would count twice
+            pieces = self.summarizer.stream_uncached_summary(job.key, text, context)
+            for piece in pieces:
+                job._append(piece)
+        except Exception as e:
+            logger.exception("summarizing failed")
+            error = e
+        with self.lock:
+            del self.running[job.key]
+            self.finished[job.key] = job
+            while len(self.finished) > FINISHED_JOBS:
+                self.finished.popitem(last=False)
+        job._finish(error)
@@ -1,19 +1,71 @@
 import os
+import time
+import random
+import asyncio
+import logging
+from typing import Iterator, List, Optional
 
-from openai import OpenAI
+from openai import (
+    AsyncOpenAI,
+    OpenAI,
+    APIConnectionError,
+    InternalServerError,
+    RateLimitError,
+)
 
+from noter_gpt.embedder.openai_embedder import estimate_tokens
 from noter_gpt.summarizer.interface import SummarizerInterface
+from noter_gpt.summarizer.token_bucket import TokenBucket
 from noter_gpt.storage import Storage
 from noter_gpt.summarizer.constants import (
     MAX_SUMMARY_LENGTH_WORDS,
 )
 
+CONCURRENT_REQUESTS = 16
+REQUESTS_PER_MINUTE = 500
+TOKENS_PER_MINUTE = 200_000
+MAX_RETRIES = 6
+INITIAL_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 60.0
+RETRIED_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+
+logger = logging.getLogger(__name__)
+
 
 class OpenAISummarizer(SummarizerInterface):
-    def __init__(self, storage: Storage = None, model: str = "gpt-3.5-turbo"):
+    """Summarizes with the chat completions API
+
+    summarize_texts sends many requests at once from an asyncio loop. The
+    number in flight is bounded, and token buckets keep requests and tokens
+    per minute under the account's limits, which default to the values of
+    NOTER_OPENAI_RPM and NOTER_OPENAI_TPM. Rate limits and transient errors
+    are retried with exponential backoff and jitter.
+    """
+
+    def __init__(
+        self,
+        storage: Storage = None,
+        model: str = "gpt-3.5-turbo",
+        api_key: str = None,
+        base_url: str = None,
+        concurrent_requests: int = CONCURRENT_REQUESTS,
+        requests_per_minute: float = None,
+        tokens_per_minute: float = None,
+        initial_backoff_seconds: float = INITIAL_BACKOFF_SECONDS,
+    ):
         super().__init__(storage=storage)
-        self.client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+        self.api_key = api_key if api_key else os.environ["OPENAI_API_KEY"]
+        self.base_url = base_url
+        self.client = OpenAI(api_key=self.api_key, base_url=base_url, max_retries=0)
         self.model = model
+        self.concurrent_requests = concurrent_requests
+        self.requests_per_minute = requests_per_minute or float(
+            os.environ.get("NOTER_OPENAI_RPM", REQUESTS_PER_MINUTE)
+        )
+        self.tokens_per_minute = tokens_per_minute or float(
+            os.environ.get("NOTER_OPENAI_TPM", TOKENS_PER_MINUTE)
+        )
+        self.initial_backoff_seconds = initial_backoff_seconds
         self._last_response = None  # debugging
 
     def _system_prompt(self) -> str:
@@ -52,21 +104,116 @@ class OpenAISummarizer(SummarizerInterface):
             '"""'
         )
 
-    def _summarize(self, text: str, context: str = None) -> str:
+    def _messages(self, text: str, context: str = None) -> List[dict]:
         if context:
             prompt_text = self._summarize_with_context_prompt(text, context)
         else:
             prompt_text = self._summarize_prompt(text)
+        return [
+            {"role": "system", "content": self._system_prompt()},
+            {"role": "user", "content": prompt_text},
+        ]
 
-        self._last_response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": self._system_prompt()},
-                {"role": "user", "content": prompt_text},
-            ],
-        ).model_dump()
+    def _summarize(self, text: str, context: str = None) -> str:
+        messages = self._messages(text, context)
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                response = self.client.chat.completions.create(
+                    model=self.model, messages=messages
+                )
+                break
+            except RETRIED_ERRORS as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                time.sleep(self._backoff_seconds(attempt, e))
 
+        self._last_response = response.model_dump()
         return self._last_response["choices"][0]["message"]["content"]
 
+    def _stream_summarize(self, text: str, context: str = None) -> Iterator[str]:
+        messages = self._messages(text, context)
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                stream = self.client.chat.completions.create(
+                    model=self.model, messages=messages, stream=True
+                )
+                break
+            except RETRIED_ERRORS as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                time.sleep(self._backoff_seconds(attempt, e))
+
+        with stream:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    def _summarize_all(self, texts: List[str]) -> List[Optional[str]]:
+        return asyncio.run(self._summarize_concurrently(texts))
+
+    async def _summarize_concurrently(self, texts: List[str]) -> List[Optional[str]]:
+        client = AsyncOpenAI(
+            api_key=self.api_key, base_url=self.base_url, max_retries=0
+        )
+        # created inside the loop they are used from, and like the API's own
+        # limits they refill per second and hold up to a minute's worth
+        requests = TokenBucket(
+            self.requests_per_minute / 60, capacity=self.requests_per_minute
+        )
+        tokens = TokenBucket(
+            self.tokens_per_minute / 60, capacity=self.tokens_per_minute
+        )
+        in_flight = asyncio.Semaphore(self.concurrent_requests)
+
+        async def summarize(text: str) -> str:
+            messages = self._messages(text)
+            # the limit counts the prompt and room for the summary
+            estimated_tokens = estimate_tokens(text) + 2 * MAX_SUMMARY_LENGTH_WORDS
+            async with in_flight:
+                for attempt in range(MAX_RETRIES + 1):
+                    await requests.acquire()
+                    await tokens.acquire(estimated_tokens)
+                    try:
+                        response = await client.chat.completions.create(
+                            model=self.model, messages=messages
+                        )
+                        break
+                    except RETRIED_ERRORS as e:
+                        if attempt == MAX_RETRIES:
+                            raise
+                        await asyncio.sleep(self._backoff_seconds(attempt, e))
+            summary = response.choices[0].message.content
+            # cached as it arrives, an interrupted batch keeps what it finished
+            self._add_to_cache(self._get_key(text), summary)
+            return summary
+
+        try:
+            results = await asyncio.gather(
+                *(summarize(text) for text in texts), return_exceptions=True
+            )
+        finally:
+            await client.close()
+        # one failed note shouldn't cost the summaries of all the others
+        summaries = []
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.error("summarizing a note failed: %s", result)
+                result = None
+            summaries.append(result)
+        return summaries
+
+    def _backoff_seconds(self, attempt: int, error: Exception) -> float:
+        response = getattr(error, "response", None)
+        retry_after = (
+            response.headers.get("retry-after") if response is not None else None
+        )
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        delay = min(MAX_BACKOFF_SECONDS, self.initial_backoff_seconds * 2**attempt)
+        return random.uniform(delay / 2, delay)
+
     def _cache_model_key(self) -> str:
         return f"OPENAI_{self.model}"
@@ -1,49 +1,60 @@
-import re
+from typing import Iterator, List
 
-from transformers import pipeline
+from transformers import TextIteratorStreamer, pipeline
 
 from noter_gpt.storage import Storage
-from noter_gpt.summarizer.util import chunk_text
-from noter_gpt.summarizer.interface import SummarizerInterface
+from noter_gpt.summarizer.chunked_summarizer import MAP_BATCH_SIZE, ChunkedSummarizer
+from noter_gpt.summarizer.util import stream_generation
 from noter_gpt.summarizer.constants import (
     MIN_SUMMARY_LENGTH_WORDS,
     MAX_SUMMARY_LENGTH_WORDS,
 )
 
 
-class PipelineSummarizer(SummarizerInterface):
+class PipelineSummarizer(ChunkedSummarizer):
     def __init__(
         self,
         model_name: str,
         min_summary_words: int = MIN_SUMMARY_LENGTH_WORDS,
         max_summary_words: int = MAX_SUMMARY_LENGTH_WORDS,
         storage: Storage = None,
+        batch_size: int = MAP_BATCH_SIZE,
     ):
         super().__init__(storage=storage)
         self.model_name = model_name
         self.min_summary_words = min_summary_words
         self.max_summary_words = max_summary_words
+        self.batch_size = batch_size
         self.summarizer = pipeline("summarization", model=model_name)
 
-    def _summarize(self, text: str, _: str = None) -> str:
-        chunks = chunk_text(text, self.summarizer.tokenizer.model_max_length * 4)
-        summaries = []
-        for chunk in chunks:
-            summary = self._summarize_chunk(chunk)
-            summaries.append(summary)
-        concatenated_summary = "\n\n".join(summaries)
-        if len(re.split(r"\W+", concatenated_summary)) <= self.max_summary_words:
-            return concatenated_summary
-        return self._summarize(concatenated_summary, _)
+    def _chunk_size(self) -> int:
+        return self.summarizer.tokenizer.model_max_length * 4
 
     def _summarize_chunk(self, chunk: str) -> str:
-        result = self.summarizer(
+        return self._summarize_chunks([chunk])[0]
+
+    def _stream_summarize_chunk(self, chunk: str) -> Iterator[str]:
+        streamer = TextIteratorStreamer(
+            self.summarizer.tokenizer, skip_special_tokens=True
+        )
+        return stream_generation(
+            streamer,
+            self.summarizer,
             chunk,
             min_length=self.min_summary_words,
             max_length=self.max_summary_words,
             do_sample=False,
         )
-        return result[0]["summary_text"]
+
+    def _summarize_chunks(self, chunks: List[str]) -> List[str]:
+        results = self.summarizer(
+            chunks,
+            min_length=self.min_summary_words,
+            max_length=self.max_summary_words,
+            do_sample=False,
+            batch_size=self.batch_size,
+        )
+        return [result["summary_text"] for result in results]
 
     def _cache_model_key(self) -> str:
         return f"LOCAL_{self.model_name}"
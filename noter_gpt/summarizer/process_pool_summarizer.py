@@ -0,0 +1,118 @@
+import os
+import multiprocessing
+from typing import Callable, List, Optional, Tuple
+
+from tqdm import tqdm
+
+from noter_gpt.storage import Storage
+from noter_gpt.summarizer.cache import SummaryCache
+from noter_gpt.summarizer.inject import inject_summarizer
+from noter_gpt.summarizer.interface import SummarizerInterface
+
+SHARD_NOTES = 32  # most notes handed to a worker at once
+SHARD_CHARS = 200_000  # most characters handed to a worker at once
+
+# set up once in every worker process
+_summarizer: SummarizerInterface = None
+
+
+def _init_worker(
+    root_path: str,
+    cache_path: str,
+    summarizer_factory: Callable[..., SummarizerInterface],
+    torch_threads: int,
+) -> None:
+    global _summarizer
+    try:
+        import torch
+
+        # workers share the cores instead of each starting one thread per core
+        torch.set_num_threads(torch_threads)
+        torch.set_num_interop_threads(1)
+    except ImportError:
+        pass
+    storage = Storage(root_path=root_path, cache_path=cache_path)
+    _summarizer = summarizer_factory(storage=storage)
+
+
+def _summarize_shard(notes: List[str]) -> List[Tuple[str, str, Optional[str]]]:
+    """Returns (note, cache key, summary) for every note, no summary if cached"""
+    texts = []
+    for note in notes:
+        with open(note, "r", encoding="utf-8") as file:
+            texts.append(file.read())
+    keys = [_summarizer._get_key(text) for text in texts]
+    uncached = [i for i, key in enumerate(keys) if not _summarizer._get_from_cache(key)]
+    results = [(note, key, None) for note, key in zip(notes, keys)]
+    summaries = _summarizer._summarize_all([texts[i] for i in uncached])
+    for i, summary in zip(uncached, summaries):
+        results[i] = (notes[i], keys[i], summary)
+    # commit chunk summaries now, pool workers exit without running atexit
+    _summarizer.cache.flush()
+    return results
+
+
+class ProcessPoolSummarizer:
+    """Summarizes all notes with a local model loaded once per worker process
+
+    Every worker pins its torch thread count to its share of the cores.
+    Notes are sorted by size, and shards of similar notes are handed out
+    largest first. Summaries stream back as shards finish and the parent
+    writes them to the cache, so an interrupted run picks up where it left
+    off.
+    """
+
+    def __init__(
+        self,
+        storage: Storage = None,
+        summarizer_factory: Callable[..., SummarizerInterface] = inject_summarizer,
+        processes: int = None,
+    ):
+        self.storage = storage if storage else Storage()
+        self.summarizer_factory = summarizer_factory
+        self.processes = processes if processes else max(1, os.cpu_count() // 2)
+        self.cache = SummaryCache(self.storage.summary_database_file())
+
+    def summarize_all_notes(self) -> None:
+        shards = self._shards(self.storage.all_notes())
+        torch_threads = max(1, os.cpu_count() // self.processes)
+        # spawn so workers don't inherit the parent's torch thread pools
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(
+            self.processes,
+            initializer=_init_worker,
+            initargs=(
+                self.storage.root_path,
+                self.storage.cache_path,
+                self.summarizer_factory,
+                torch_threads,
+            ),
+        ) as pool, tqdm(total=sum(len(shard) for shard in shards)) as progress:
+            for results in pool.imap_unordered(_summarize_shard, shards):
+                for _, key, summary in results:
+                    if summary is not None:
+                        self.cache.put(key, summary)
+                progress.update(len(results))
+        self.cache.flush()
+
+    def _shards(self, notes: List[str]) -> List[List[str]]:
+        infos = self.storage.catalog.info()
+        sizes = {
+            note: infos[note].size if note in infos else os.path.getsize(note)
+            for note in notes
+        }
+        shards = []
+        shard = []
+        shard_chars = 0
+        for note in sorted(notes, key=sizes.get, reverse=True):
+            if shard and (
+                len(shard) >= SHARD_NOTES or shard_chars + sizes[note] > SHARD_CHARS
+            ):
+                shards.append(shard)
+                shard = []
+                shard_chars = 0
+            shard.append(note)
+            shard_chars += sizes[note]
+        if shard:
+            shards.append(shard)
+        return shards
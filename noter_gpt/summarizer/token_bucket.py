@@ -0,0 +1,33 @@
+import time
+import asyncio
+
+
+class TokenBucket:
+    """Lets through `rate` units per second on average, in bursts up to `capacity`
+
+    Used to keep requests and tokens sent to an API under its rate limits. An
+    amount larger than the capacity waits for a full bucket and leaves it in
+    debt, so later callers wait until it is paid back and the average rate
+    still holds.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity else rate
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1) -> None:
+        needed = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.available = min(
+                    self.capacity, self.available + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.available >= needed:
+                    self.available -= amount
+                    return
+                await asyncio.sleep((needed - self.available) / self.rate)
@@ -1,5 +1,7 @@
 import re
-from typing import Iterator
+import hashlib
+import threading
+from typing import Callable, Iterator, List
 
 
 def chunk_text(text: str, chunk_size: int) -> Iterator[str]:
@@ -26,6 +28,45 @@ def chunk_text(text: str, chunk_size: int) -> Iterator[str]:
                     text = text[chunk_size:]
 
 
+def chunk_paragraphs(text: str, chunk_size: int) -> Iterator[str]:
+    """
+    Packs whole paragraphs into chunks of at most `chunk_size` characters.
+    Among the paragraph breaks in the final third of a chunk, the chunk ends after the
+    paragraph with the smallest hash rather than the last one that fits. Boundaries then
+    depend on the paragraphs around them, so an edit moves at most the boundaries next to it.
+    Paragraphs longer than a chunk are split with `chunk_text`.
+    """
+    pieces = []
+    for paragraph in text.split("\n\n"):
+        pieces.extend(chunk_text(paragraph, chunk_size))
+
+    chunk: List[str] = []
+    for piece in pieces:
+        while chunk and len("\n\n".join(chunk + [piece])) > chunk_size:
+            end = _chunk_end(chunk, chunk_size)
+            yield "\n\n".join(chunk[:end])
+            chunk = chunk[end:]
+        chunk.append(piece)
+    if chunk:
+        yield "\n\n".join(chunk)
+
+
+def _chunk_end(paragraphs: List[str], chunk_size: int) -> int:
+    """Number of paragraphs to end the chunk after"""
+    candidates = []
+    length = -2
+    for i, paragraph in enumerate(paragraphs):
+        length += len(paragraph) + 2
+        if length >= chunk_size * 2 / 3:
+            candidates.append(i)
+    if not candidates:
+        return len(paragraphs)
+    best = min(
+        candidates, key=lambda i: hashlib.md5(paragraphs[i].encode("utf-8")).digest()
+    )
+    return best + 1
+
+
 def chunk_by_tokens(text: str, tokenizer) -> Iterator[str]:
     """
     This method divides the input text into chunks based on how it is tokenized by the passed tokenizer.
@@ -84,3 +125,26 @@ def chunk_by_tokens(text: str, tokenizer) -> Iterator[str]:
 
     if chunk.strip():
         yield chunk.strip()
+
+
+def stream_generation(streamer, generate: Callable, *args, **kwargs) -> Iterator[str]:
+    """
+    Runs `generate` on a thread and yields the text it sends to `streamer`, a
+    TextIteratorStreamer. Waiting on the streamer has no timeout, so if generation fails
+    the streamer is ended to stop the iteration and the error is raised to the caller.
+    """
+    errors = []
+
+    def run():
+        try:
+            generate(*args, streamer=streamer, **kwargs)
+        except BaseException as e:
+            errors.append(e)
+            streamer.end()
+
+    generation = threading.Thread(target=run, daemon=True)
+    generation.start()
+    yield from streamer
+    generation.join()
+    if errors:
+        raise errors[0]
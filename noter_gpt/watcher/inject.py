@@ -0,0 +1,15 @@
+from noter_gpt.watcher.interface import WatcherInterface
+from noter_gpt.watcher.inotify_watcher import InotifyWatcher
+from noter_gpt.watcher.polling_watcher import PollingWatcher
+from noter_gpt.storage import Storage
+
+WATCHER_PREFERENCE = [InotifyWatcher, PollingWatcher]
+
+
+def inject_watcher(storage: Storage = None) -> WatcherInterface:
+    for watcher in WATCHER_PREFERENCE:
+        instance = watcher(storage)
+        if instance.is_available():
+            return instance
+
+    raise AssertionError("No available watchers")
@@ -0,0 +1,141 @@
+import os
+import errno
+import ctypes
+import ctypes.util
+import select
+import struct
+import threading
+from typing import Dict, List, Optional
+
+from noter_gpt.catalog import is_hidden, is_note
+from noter_gpt.storage import Storage
+from noter_gpt.watcher.interface import WatcherInterface
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+WAIT_SECONDS = 1.0
+
+
+def _load_libc():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class InotifyWatcher(WatcherInterface):
+    """Uses linux inotify to hear about changed notes as they happen"""
+
+    def __init__(self, storage: Storage = None):
+        self.storage = storage
+        if not self.storage:
+            self.storage = Storage()
+        self.libc = _load_libc()
+        self.fd = None
+        self.watches: Dict[int, str] = {}  # watch descriptor -> directory
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def _start(self) -> None:
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watch_tree(str(self.storage.root_path))
+
+    def _watch_tree(self, directory: str) -> List[str]:
+        """Watches `directory` and its subdirectories, returns the notes inside"""
+        notes = []
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = [d for d in dirs if not is_hidden(d)]
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(root), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOENT:
+                    continue
+                raise OSError(error, f"inotify_add_watch failed for {root}")
+            self.watches[wd] = root
+            notes += [
+                self._relative(os.path.join(root, f)) for f in files if is_note(f)
+            ]
+        return notes
+
+    def _relative(self, path: str) -> str:
+        return os.path.relpath(path, self.storage.root_path)
+
+    def changes(self) -> Optional[List[str]]:
+        with self.lock:
+            if self.closed:
+                return []
+            if self.fd is None:
+                self._start()
+                return None  # changes made before watching started are unknown
+            return self._read_changes()
+
+    def _read_changes(self) -> Optional[List[str]]:
+        readable, _, _ = select.select([self.fd], [], [], WAIT_SECONDS)
+        if not readable:
+            return []
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                return None  # events were lost
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            if wd not in self.watches or not name:
+                continue
+
+            path = os.path.join(self.watches[wd], name)
+            if mask & IN_ISDIR:
+                if is_hidden(name):
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    changed.update(self._watch_tree(path))
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    return None  # every note below it went away
+            elif is_note(name) and not mask & IN_CREATE:
+                changed.add(self._relative(path))
+        return sorted(changed)
+
+    def close(self) -> None:
+        self.closed = True
+        with self.lock:
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+                self.watches = {}
+
+    def is_available(self) -> bool:
+        if self.libc is None:
+            return False
+        fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return False
+        os.close(fd)
+        return True
@@ -0,0 +1,28 @@
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+from noter_gpt.storage import Storage
+
+
+class WatcherInterface(ABC):
+    """Reports notes that changed on disk"""
+
+    @abstractmethod
+    def __init__(self, storage: Storage) -> None:
+        pass
+
+    @abstractmethod
+    def changes(self) -> Optional[List[str]]:
+        """Blocks briefly and returns the notes that were added, changed or
+        removed since the last call, or None if any note may have changed"""
+        pass
+
+    @abstractmethod
+    def close(self) -> None:
+        """Stops watching and releases any resources"""
+        pass
+
+    @abstractmethod
+    def is_available(self) -> bool:
+        """Returns True if the watcher is available for immediate use"""
+        pass
@@ -0,0 +1,51 @@
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from noter_gpt.storage import Storage
+from noter_gpt.watcher.interface import WatcherInterface
+
+POLL_INTERVAL_SECONDS = 2.0
+
+
+class PollingWatcher(WatcherInterface):
+    """Finds changed notes by comparing stat signatures between walks"""
+
+    def __init__(
+        self, storage: Storage = None, interval: float = POLL_INTERVAL_SECONDS
+    ):
+        self.storage = storage
+        if not self.storage:
+            self.storage = Storage()
+        self.interval = interval
+        self.closed = threading.Event()
+        self.signatures = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[int, int, int]]:
+        signatures = {}
+        for note in self.storage.all_notes():
+            try:
+                stat = os.stat(self.storage.note_abs_path(note))
+            except FileNotFoundError:
+                continue
+            signatures[note] = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        return signatures
+
+    def changes(self) -> Optional[List[str]]:
+        if self.closed.wait(self.interval):
+            return []
+        signatures = self._scan()
+        changed = [
+            note
+            for note in signatures.keys() | self.signatures.keys()
+            if signatures.get(note) != self.signatures.get(note)
+        ]
+        self.signatures = signatures
+        return sorted(changed)
+
+    def close(self) -> None:
+        self.closed.set()
+
+    def is_available(self) -> bool:
+        # this is the always-available fallback
+        return True
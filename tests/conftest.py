@@ -1,3 +1,7 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import pytest
 
 from noter_gpt.storage import Storage
@@ -28,3 +32,90 @@ def storage(shared_datadir):
         root_path=(shared_datadir / "notes"),
         cache_path=(shared_datadir / "notes" / ".noter"),
     )
+
+
+class OpenAIStubHandler(BaseHTTPRequestHandler):
+    """Minimal OpenAI compatible endpoint that rate limits every third request
+
+    Chat prompts containing BAD REQUEST are rejected with a 400.
+    """
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        stub = self.server.stub
+        with stub["lock"]:
+            stub["requests"].append(body)
+            rate_limited = len(stub["requests"]) % 3 == 1
+        if rate_limited:
+            self._reply(429, {"error": {"message": "slow down", "type": "rate"}})
+        elif "BAD REQUEST" in json.dumps(body.get("messages", "")):
+            self._reply(400, {"error": {"message": "bad request", "type": "invalid"}})
+        elif self.path.endswith("/embeddings"):
+            data = [
+                {"object": "embedding", "index": i, "embedding": [len(text)] * 1536}
+                for i, text in enumerate(body["input"])
+            ]
+            usage = {"prompt_tokens": 0, "total_tokens": 0}
+            self._reply(
+                200,
+                {"object": "list", "data": data, "model": "stub", "usage": usage},
+            )
+        elif self.path.endswith("/chat/completions") and body.get("stream"):
+            prompt = body["messages"][-1]["content"]
+            self._stream(["summary ", "of ", str(len(prompt))])
+        elif self.path.endswith("/chat/completions"):
+            prompt = body["messages"][-1]["content"]
+            message = {"role": "assistant", "content": f"summary of {len(prompt)}"}
+            choice = {"index": 0, "message": message, "finish_reason": "stop"}
+            usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+            self._reply(
+                200,
+                {
+                    "id": "stub",
+                    "object": "chat.completion",
+                    "created": 0,
+                    "model": "stub",
+                    "choices": [choice],
+                    "usage": usage,
+                },
+            )
+        else:
+            self._reply(404, {"error": {"message": "not found"}})
+
+    def _reply(self, status, payload):
+        encoded = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def _stream(self, pieces):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for piece in pieces:
+            chunk = {
+                "id": "stub",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": "stub",
+                "choices": [{"index": 0, "delta": {"content": piece}}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def openai_stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OpenAIStubHandler)
+    server.stub = {"lock": threading.Lock(), "requests": []}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.stub["base_url"] = f"http://127.0.0.1:{server.server_port}/v1"
+    yield server.stub
+    server.shutdown()
+    server.server_close()
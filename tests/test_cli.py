@@ -1,4 +1,11 @@
-from noter_gpt.cli import search_documents, summarize_document
+import pytest
+
+from noter_gpt.cli import (
+    search_documents,
+    summarize_all,
+    summarize_document,
+    summary_cache_stats,
+)
 
 
 def test_search_documents(shared_datadir, storage):
@@ -20,3 +27,14 @@ def test_summarize_document(shared_datadir, storage):
     assert isinstance(summary, str)
     assert len(summary) > 0
     assert len(summary) < len(source_file_contents)
+
+
+def test_summary_cache_stats(storage):
+    stats = summary_cache_stats(storage)
+    assert stats["size"]["entries"] == 0
+    assert stats["total"]["hits"] == 0
+
+
+def test_summarize_all_rejects_processes_with_openai(storage):
+    with pytest.raises(ValueError):
+        summarize_all(storage, use_openai=True, processes=2)
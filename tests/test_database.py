@@ -1,14 +1,26 @@
 import os
 import pytest
+import numpy as np
 from noter_gpt.database.annoy_database import AnnoyDatabase
+from noter_gpt.database.numpy_database import NumpyDatabase
+from noter_gpt.database.embedding_store import EmbeddingStore
+from noter_gpt.database.journaled_table import JournaledTable
+from noter_gpt.database.knn_graph import KnnGraph
 
 
-@pytest.fixture
-def database(storage):
-    return AnnoyDatabase(storage=storage)
+@pytest.fixture(params=[AnnoyDatabase, NumpyDatabase])
+def database(request, storage):
+    return request.param(storage=storage)
 
 
 def test_build_or_update_index(database, storage):
+    assert not os.path.exists(database.embedding_cache_file)
+    database.build_or_update_index()
+    assert os.path.exists(database.embedding_cache_file)
+
+
+def test_annoy_database_saves_index(storage):
+    database = AnnoyDatabase(storage=storage)
     assert not os.path.exists(storage.built_index_file(database.embedder.identifier))
     database.build_or_update_index()
     assert os.path.exists(storage.built_index_file(database.embedder.identifier))
@@ -28,3 +40,174 @@ def test_find_similar_respects_n(database, storage):
         os.path.join(storage.root_path, "countries", "united_states.txt"), n=1
     )
     assert len(search_results) == 1
+
+
+def test_find_similar_to_note_reads_graph(database, storage):
+    database.build_or_update_index()
+    with open(storage.note_abs_path("countries/united_states.txt"), "r") as f:
+        text = f.read()
+    related = database.find_similar_to_note("countries/united_states.txt", text)
+    assert [path for path, _ in related] == [
+        path for path, _ in database.find_similar(text)
+    ]
+    assert os.path.exists(database.knn_graph_file)
+
+
+def test_knn_graph_updates_match_full_build(tmp_path):
+    rng = np.random.default_rng(0)
+    matrix = rng.normal(size=(50, 8)).astype(np.float32)
+    hashes = [str(row) for row in range(50)]
+    graph = KnnGraph(str(tmp_path / "graph.npz"), k=3)
+    graph.sync(matrix, hashes)
+
+    matrix[7] = rng.normal(size=8)
+    hashes[7] = "7b"
+    hashes[12] = None
+    matrix = np.vstack([matrix, rng.normal(size=(1, 8)).astype(np.float32)])
+    hashes.append("50")
+    graph.sync(matrix, hashes)
+    graph.save()
+
+    expected = KnnGraph(str(tmp_path / "expected.npz"), k=3)
+    expected.sync(matrix, hashes)
+    reloaded = KnnGraph(graph.graph_file, k=3)
+    reloaded.load()
+    assert reloaded.table.neighbours.tolist() == expected.table.neighbours.tolist()
+    assert 12 not in reloaded.table.neighbours
+    assert [row for row, _ in reloaded.neighbours_of(7, 2)] == (
+        expected.table.neighbours[7][:2].tolist()
+    )
+
+
+def test_numpy_database_updates_rows_in_place(storage):
+    database = NumpyDatabase(storage=storage)
+    database.build_or_update_index()
+    with open(storage.note_abs_path("countries/germany.txt"), "w") as f:
+        f.write("Germany is a country in Europe, its capital is Berlin.")
+    os.remove(storage.note_abs_path("car.txt"))
+    database.build_or_update_index()
+    assert not database.need_rebuild
+    assert "car.txt" not in database.rows.paths
+    assert "countries/germany.txt" in database.rows.paths
+
+
+def test_upsert_and_delete(database, storage):
+    database.build_or_update_index()
+    text = "Germany is a country in Europe, its capital is Berlin."
+    database.upsert("countries/germany.txt", text)
+    database.delete("countries/canada.txt")
+    similar = [path for path, _ in database.find_similar(text, n=10)]
+    assert "countries/canada.txt" not in similar
+    assert "countries/germany.txt" not in similar  # excluded as the note itself
+    assert "countries/germany.txt" in database.documents
+
+
+def test_edits_only_embed_changed_passages(database, storage):
+    database.build_or_update_index()
+    paragraphs = [f"Paragraph {i} of a long note about countries." for i in range(5)]
+    database.upsert("long.txt", "\n\n".join(paragraphs))
+    passage_count = len(database.passages)
+
+    paragraphs[2] = "A paragraph about cars instead."
+    database.upsert("long.txt", "\n\n".join(paragraphs))
+    assert len(database.passages) == passage_count
+    assert database.passage_refs.get("long.txt")[2][0] in database.passages
+
+    database.delete("long.txt")
+    assert len(database.passages) == passage_count - 5
+
+
+def test_renames_and_copies_reuse_embeddings(database, storage, monkeypatch):
+    database.build_or_update_index()
+    os.rename(storage.note_abs_path("car.txt"), storage.note_abs_path("vehicle.txt"))
+    with open(storage.note_abs_path("people/elon.txt"), "r") as f:
+        copy = f.read()
+    with open(storage.note_abs_path("elon_copy.txt"), "w") as f:
+        f.write(copy)
+
+    embedded = []
+
+    def embed_batch(texts):
+        embedded.extend(texts)
+        return np.zeros((len(texts), database.dimension()), dtype=np.float32)
+
+    monkeypatch.setattr(database.embedder, "embed_batch", embed_batch)
+    database.build_or_update_index()
+    assert embedded == []
+    assert "vehicle.txt" in database.documents
+    assert "car.txt" not in database.documents
+    assert database.passage_refs.get("elon_copy.txt") == database.passage_refs.get(
+        "people/elon.txt"
+    )
+
+
+def test_annoy_database_reuses_saved_index(storage):
+    database = AnnoyDatabase(storage=storage)
+    database.build_or_update_index()
+    ids = dict(database.snapshot.item_ids)
+    os.remove(storage.note_abs_path("car.txt"))
+
+    reloaded = AnnoyDatabase(storage=storage, embedder=database.embedder)
+    reloaded.build_or_update_index()
+    assert not reloaded.need_rebuild
+    assert reloaded.snapshot.tombstones == {ids["car.txt"]}
+    reloaded.rebuild_index()
+    assert reloaded.snapshot.item_ids == {
+        path: i for path, i in ids.items() if path != "car.txt"
+    }
+
+
+def test_embedding_store_updates_rows_in_place(tmp_path):
+    matrix_file = str(tmp_path / "embeddings.f32")
+    manifest_file = str(tmp_path / "embeddings.json")
+    store = EmbeddingStore(matrix_file, manifest_file, 3)
+    store.put("a.txt", "hash_a", np.array([1, 2, 3]))
+    store.put("b.txt", "hash_b", np.array([4, 5, 6]))
+    store.put("a.txt", "hash_a2", np.array([7, 8, 9]))
+    store.remove("b.txt")
+    store.put("c.txt", "hash_c", np.array([0, 0, 1]))
+    store.flush()
+
+    assert os.path.getsize(matrix_file) == 2 * 3 * 4
+    reloaded = EmbeddingStore(matrix_file, manifest_file, 3)
+    assert list(reloaded) == ["a.txt", "c.txt"]
+    assert reloaded.hash("a.txt") == "hash_a2"
+    assert reloaded.vector("a.txt").tolist() == [7, 8, 9]
+    assert reloaded.vector("c.txt").tolist() == [0, 0, 1]
+    assert reloaded.keys == ["a.txt", "c.txt"]
+
+    # small changes are journaled instead of rewriting the manifest
+    reloaded.put("d.txt", "hash_d", np.array([1, 1, 1]))
+    reloaded.remove("a.txt")
+    reloaded.flush()
+    assert os.path.exists(reloaded.journal_file)
+    replayed = EmbeddingStore(matrix_file, manifest_file, 3)
+    assert list(replayed) == ["c.txt", "d.txt"]
+    assert replayed.vector("d.txt").tolist() == [1, 1, 1]
+
+
+def test_journaled_table_replays_journal(tmp_path):
+    table_file = str(tmp_path / "table.json")
+    table = JournaledTable(table_file)
+    table.put("a.txt", [1])
+    table.put("b.txt", [2])
+    table.flush()
+
+    table.put("c.txt", [3])
+    table.remove("a.txt")
+    table.flush()
+    assert os.path.exists(table.journal_file)
+    with open(table.journal_file, "a") as f:
+        f.write('["put", "torn')  # a crash in the middle of a write
+
+    reloaded = JournaledTable(table_file)
+    assert dict(reloaded.entries) == {"b.txt": [2], "c.txt": [3]}
+
+    # changes journaled after the crash survive the next load
+    reloaded.put("d.txt", [4])
+    reloaded.flush()
+    assert dict(JournaledTable(table_file).entries) == {
+        "b.txt": [2],
+        "c.txt": [3],
+        "d.txt": [4],
+    }
@@ -13,6 +13,20 @@ def test_transformers_embedder(shared_datadir):
     assert embedding.shape == (transformers_embedder.dimension(),)
 
 
+def test_transformers_embedder_batch_matches_single(shared_datadir):
+    transformers_embedder = TransformersEmbedder()
+    texts = [
+        (shared_datadir / "notes" / "animals" / "cat.txt").read_text(),
+        "a short note",
+        (shared_datadir / "notes" / "car.txt").read_text(),
+    ]
+    embeddings = transformers_embedder.embed_batch(texts)
+    assert embeddings.shape == (len(texts), transformers_embedder.dimension())
+    for text, embedding in zip(texts, embeddings):
+        single = transformers_embedder.embed_text(text)
+        assert np.allclose(single, embedding, atol=1e-5)
+
+
 @pytest.mark.api
 def test_openai_embedder(shared_datadir):
     openai_embedder = OpenAIEmbedder()
@@ -20,3 +34,39 @@ def test_openai_embedder(shared_datadir):
     embedding = openai_embedder.embed_file(file_path)
     assert isinstance(embedding, np.ndarray)
     assert embedding.shape == (openai_embedder.dimension(),)
+
+
+def test_openai_embedder_batches_and_retries(openai_stub):
+    openai_embedder = OpenAIEmbedder(
+        api_key="test",
+        base_url=openai_stub["base_url"],
+        max_request_tokens=100,
+        initial_backoff_seconds=0.01,
+    )
+    texts = [f"note number {i}" * (i + 1) for i in range(10)]
+    embeddings = openai_embedder.embed_batch(texts)
+    assert embeddings.shape == (len(texts), openai_embedder.dimension())
+    assert [row[0] for row in embeddings] == [len(text) for text in texts]
+
+    batches = [r["input"] for r in openai_stub["requests"]]
+    assert 1 < len(set(map(tuple, batches))) < len(texts)
+    # budgeted at a token per character, as dense text can take
+    assert all(sum(map(len, batch)) <= 100 for batch in batches if len(batch) > 1)
+
+
+def test_openai_embedder_skips_empty_texts(openai_stub):
+    openai_embedder = OpenAIEmbedder(
+        api_key="test", base_url=openai_stub["base_url"], initial_backoff_seconds=0.01
+    )
+    embeddings = openai_embedder.embed_batch(["", "a note", "  "])
+    assert [row[0] for row in embeddings] == [0, len("a note"), 0]
+    inputs = [text for r in openai_stub["requests"] for text in r["input"]]
+    assert all(text.strip() for text in inputs)
+
+
+def test_openai_embedder_cuts_dense_text_to_the_token_limit():
+    openai_embedder = OpenAIEmbedder(api_key="test")
+    dense = "日本" * 10_000  # about a token per character
+    passages = openai_embedder.split_passages(dense)
+    assert len(passages) > 1
+    assert all(len(passage) <= 8191 for passage in passages)
@@ -0,0 +1,153 @@
+import os
+import queue
+import threading
+
+import numpy as np
+import pytest
+
+from noter_gpt.database.numpy_database import NumpyDatabase
+from noter_gpt.embedder.interface import EmbedderInterface
+from noter_gpt.indexer import BackgroundIndexer
+
+
+class FakeWatcher:
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.delivered = False
+
+    def put(self, *changes):
+        """Reports changes and returns once the indexer was notified of them"""
+        for change in changes:
+            self.queue.put(change)
+        self.queue.join()
+
+    def changes(self):
+        # being asked again means the last changes were passed on
+        if self.delivered:
+            self.delivered = False
+            self.queue.task_done()
+        try:
+            changes = self.queue.get(timeout=0.01)
+        except queue.Empty:
+            return []
+        self.delivered = True
+        return changes
+
+    def close(self):
+        pass
+
+
+class FakeDatabase:
+    def __init__(self, storage):
+        self.storage = storage
+        self.calls = []
+        self.need_rebuild = False
+        self.lock = threading.Lock()
+
+    def upsert(self, note, text):
+        with self.lock:
+            self.calls.append(("upsert", note))
+            self.need_rebuild = True
+
+    def delete(self, note):
+        with self.lock:
+            self.calls.append(("delete", note))
+            self.need_rebuild = True
+
+    def rebuild_index(self):
+        with self.lock:
+            self.calls.append(("rebuild_index",))
+            self.need_rebuild = False
+
+    def build_or_update_index(self):
+        with self.lock:
+            self.calls.append(("build_or_update_index",))
+
+
+class CountingEmbedder(EmbedderInterface):
+    """Embeds texts by their length and counts the texts it embedded"""
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_text(self, text):
+        self.embedded.append(text)
+        return np.array([len(text), 1, 0, 0], dtype=np.float32)
+
+    def embed_file(self, file_path):
+        return super().embed_file(file_path)
+
+    def dimension(self):
+        return 4
+
+    @property
+    def identifier(self):
+        return "counting"
+
+
+@pytest.fixture
+def indexer(storage):
+    watcher = FakeWatcher()
+    indexer = BackgroundIndexer(FakeDatabase(storage), watcher, debounce_seconds=0.05)
+    indexer.start()
+    yield indexer, watcher
+    indexer.stop()
+
+
+def test_indexer_coalesces_a_burst_of_changes(indexer):
+    indexer, watcher = indexer
+    watcher.put(*[["car.txt"]] * 5)
+    indexer.notify(["plane.txt", "car.txt"])
+    watcher.put(["countries/japan.txt"])
+    assert indexer.wait_until_idle(timeout=5)
+    assert indexer.database.calls == [
+        ("upsert", "car.txt"),
+        ("upsert", "countries/japan.txt"),
+        ("upsert", "plane.txt"),
+        ("rebuild_index",),
+    ]
+
+
+def test_indexer_deletes_removed_notes(indexer, storage):
+    indexer, watcher = indexer
+    os.remove(storage.note_abs_path("plane.txt"))
+    watcher.put(["plane.txt"], ["car.txt"])
+    assert indexer.wait_until_idle(timeout=5)
+    assert indexer.database.calls == [
+        ("upsert", "car.txt"),
+        ("delete", "plane.txt"),
+        ("rebuild_index",),
+    ]
+
+
+def test_indexer_rescans_when_any_note_may_have_changed(indexer):
+    indexer, watcher = indexer
+    watcher.put(["car.txt"], None)
+    assert indexer.wait_until_idle(timeout=5)
+    assert indexer.database.calls == [("build_or_update_index",)]
+
+    # without a rebuild flagged, upserts leave the index as it is
+    indexer.database.upsert = lambda note, text: None
+    indexer.notify(["car.txt"])
+    assert indexer.wait_until_idle(timeout=5)
+    assert indexer.database.calls == [("build_or_update_index",)]
+
+
+def test_indexer_renames_reuse_embeddings(storage):
+    embedder = CountingEmbedder()
+    database = NumpyDatabase(storage=storage, embedder=embedder)
+    database.build_or_update_index()
+    embedder.embedded.clear()
+    indexer = BackgroundIndexer(database, FakeWatcher(), debounce_seconds=0.05)
+    indexer.start()
+
+    # the old path sorts before the new one, so it is seen first
+    os.rename(
+        storage.note_abs_path("animals/cat.txt"), storage.note_abs_path("zoo.txt")
+    )
+    indexer.notify(["animals/cat.txt", "zoo.txt"])
+    assert indexer.wait_until_idle(timeout=5)
+    indexer.stop()
+    assert "zoo.txt" in database.documents
+    assert "animals/cat.txt" not in database.documents
+    assert embedder.embedded == []
@@ -1,6 +1,10 @@
+import os
+
 import pytest
 from noter_gpt.searcher.native_searcher import NativeSearcher
 from noter_gpt.searcher.ripgrep_searcher import RipgrepSearcher
+from noter_gpt.searcher import trigram_index
+from noter_gpt.searcher.trigram_index import regex_query, trigram_id
 
 
 @pytest.fixture(params=[NativeSearcher, RipgrepSearcher])
@@ -48,3 +52,77 @@ def test_regex_search_smart_case_sensitive(searcher):
         "websites/facebook.txt",
         "websites/youtube.txt",
     ]
+
+
+@pytest.mark.parametrize(
+    "query", ["car", "ar", " car", "car ", "Car", "the car", "United States", "!"]
+)
+def test_text_search_index_matches_full_scan(storage, query):
+    searcher = NativeSearcher(storage=storage)
+    assert searcher.text_search(query) == searcher._search(query, is_regex=False)
+
+
+def test_text_search_index_follows_changes(storage):
+    searcher = NativeSearcher(storage=storage)
+    searcher.notify(None)
+    assert searcher.text_search("quokka") == []
+
+    with open(storage.note_abs_path("animals/quokka.txt"), "w") as f:
+        f.write("The quokka is a small marsupial.")
+    os.remove(storage.note_abs_path("car.txt"))
+    searcher.notify(["animals/quokka.txt", "car.txt"])
+    assert searcher.text_search("quokka") == ["animals/quokka.txt"]
+    assert "car.txt" not in searcher.text_search("car")
+
+    # a fresh searcher reads the stored index and catches up by hash
+    with open(storage.note_abs_path("animals/quokka.txt"), "w") as f:
+        f.write("The wombat digs burrows.")
+    searcher = NativeSearcher(storage=storage)
+    assert searcher.text_search("quokka") == []
+    assert searcher.text_search("wombat") == ["animals/quokka.txt"]
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    [r"u...ed", r"U...ed", r"(car|plane)s?", r"uni\w+ sta", r"^The", r"To+kyo", r"x?"],
+)
+def test_regex_search_index_matches_full_scan(storage, pattern):
+    searcher = NativeSearcher(storage=storage)
+    assert searcher.regex_search(pattern) == searcher._search(pattern, is_regex=True)
+
+
+def test_regex_query_trigrams():
+    assert regex_query("abcd") == (
+        "or",
+        [("and", [trigram_id("abc"), trigram_id("bcd")])],
+    )
+    # case is folded, so the same trigrams serve case insensitive searches
+    assert regex_query("ABC") == regex_query("abc")
+    assert regex_query("ab|abc") is None
+    assert regex_query(".*") is None
+    assert regex_query("(ab)+") is None
+    assert regex_query("abc.*xyz") == (
+        "and",
+        [
+            ("or", [("and", [trigram_id("abc")])]),
+            ("or", [("and", [trigram_id("xyz")])]),
+        ],
+    )
+
+
+def test_regex_search_index_snapshot_and_changes(storage, monkeypatch):
+    monkeypatch.setattr(trigram_index, "MIN_REBUILD_NOTES", 0)
+    searcher = NativeSearcher(storage=storage)
+    assert searcher.regex_search(r"To+kyo") == ["countries/japan.txt"]
+    assert searcher.trigrams.postings is not None
+
+    # a single change stays out of the snapshot until enough notes changed
+    with open(storage.note_abs_path("countries/japan.txt"), "w") as f:
+        f.write("Nothing to see.")
+    searcher.notify(None)
+    assert searcher.regex_search(r"To+kyo") == []
+    assert searcher.regex_search(r"No?thing") == ["countries/japan.txt"]
+    assert list(searcher.trigrams.changed) == ["countries/japan.txt"]
+
+    searcher = NativeSearcher(storage=storage)
+    assert searcher.regex_search(r"No?thing") == ["countries/japan.txt"]
@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import threading
+
+import pytest
+
+from noter_gpt import server
+from noter_gpt.server import LONG_POLL_SECONDS
+from noter_gpt.database.numpy_database import NumpyDatabase
+from noter_gpt.embedder.openai_embedder import OpenAIEmbedder
+from noter_gpt.summarizer.job_queue import SummaryJobQueue
+from tests.test_summarizer import FirstWordsSummarizer
+
+
+class NullIndexer:
+    def notify(self, notes=None):
+        pass
+
+
+@pytest.fixture
+def client(storage, openai_stub, monkeypatch):
+    embedder = OpenAIEmbedder(
+        api_key="test", base_url=openai_stub["base_url"], initial_backoff_seconds=0.01
+    )
+    database = NumpyDatabase(storage=storage, embedder=embedder)
+    database.build_or_update_index()
+    summarizer = FirstWordsSummarizer(storage)
+    summary_jobs = SummaryJobQueue(summarizer)
+    monkeypatch.setattr(server, "storage", storage, raising=False)
+    monkeypatch.setattr(server, "database", database, raising=False)
+    monkeypatch.setattr(server, "indexer", NullIndexer(), raising=False)
+    monkeypatch.setattr(server, "summarizer", summarizer, raising=False)
+    monkeypatch.setattr(server, "summary_jobs", summary_jobs, raising=False)
+    yield server.app.test_client()
+    summary_jobs.shutdown()
+
+
+def test_note_page_lists_similar_notes(client):
+    response = client.get("/note/countries/japan.txt")
+    assert response.status_code == 200
+    assert b"countries/japan.txt" in response.data
+    assert response.data.count(b'class="similar_note"') == 5
+
+
+def test_summary_wait_is_validated_and_capped(client):
+    release = threading.Event()
+    summarize_chunk = server.summarizer._summarize_chunk
+
+    def gated_summarize_chunk(chunk):
+        release.wait()
+        return summarize_chunk(chunk)
+
+    server.summarizer._summarize_chunk = gated_summarize_chunk
+    text = {"text": "A short note about cats."}
+    assert client.post("/text-summary?wait=abc", json=text).status_code == 400
+    assert client.get("/note-summary/car.txt?wait=abc").status_code == 400
+    assert client.get("/summary-job/unknown?wait=abc").status_code == 400
+
+    started = time.monotonic()
+    pending = client.post("/text-summary?wait=-5", json=text)
+    assert pending.status_code == 202
+    assert client.get(pending.json["status_url"] + "?wait=0").status_code == 202
+    assert time.monotonic() - started < LONG_POLL_SECONDS
+
+    release.set()
+    done = client.get(pending.headers["Location"] + "?wait=5")
+    assert done.status_code == 200
+    assert done.get_data(as_text=True) == "A short note about"
+
+
+def test_note_summary_is_validated_by_etag_only(client):
+    response = client.get("/note-summary/car.txt")
+    assert response.status_code == 200
+    assert "Last-Modified" not in response.headers
+    assert response.headers["Cache-Control"] == "no-cache"
+    etag = response.headers["ETag"]
+
+    # the mtime misses model switches, so If-Modified-Since is ignored
+    since = {"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"}
+    assert client.get("/note-summary/car.txt", headers=since).status_code == 200
+    revalidated = client.get("/note-summary/car.txt", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == etag
+
+
+def test_note_content_answers_304_until_it_changes(client, storage):
+    response = client.get("/note-content/car.txt")
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "no-cache"
+    etag = response.headers["ETag"]
+    last_modified = response.headers["Last-Modified"]
+
+    unchanged = client.get("/note-content/car.txt", headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.data == b""
+    since = {"If-Modified-Since": last_modified}
+    assert client.get("/note-content/car.txt", headers=since).status_code == 304
+
+    with open(storage.note_abs_path("car.txt"), "a") as f:
+        f.write("\nCars have wheels.")
+    changed = client.get("/note-content/car.txt", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert client.get("/note-content/missing.txt").status_code == 404
+
+
+def test_versioned_note_summary_is_immutable(client, storage):
+    note_hash = storage.manifest.hash_and_mtime("car.txt")[0]
+    response = client.get(f"/note-summary/car.txt?v={note_hash}")
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == server.IMMUTABLE
+    stale = client.get("/note-summary/car.txt?v=0123")
+    assert stale.headers["Cache-Control"] == "no-cache"
+    assert client.get("/note-summary/missing.txt").status_code == 404
+
+
+def test_notes_are_listed_a_page_at_a_time(client, storage):
+    paths = []
+    cursor = None
+    while True:
+        query = {"limit": 5, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/notes", query_string=query)
+        assert response.status_code == 200
+        assert len(response.json["notes"]) <= 5
+        paths += [note["path"] for note in response.json["notes"]]
+        cursor = response.json["next_cursor"]
+        if cursor is None:
+            break
+    assert paths == storage.all_notes()
+
+    websites = client.get("/notes?prefix=websites/").json
+    assert [note["path"] for note in websites["notes"]] == [
+        "websites/facebook.txt",
+        "websites/google.txt",
+        "websites/wiki.txt",
+        "websites/youtube.txt",
+    ]
+    assert websites["next_cursor"] is None
+    assert websites["notes"][0]["url"] == "/note/websites/facebook.txt"
+
+    assert client.get("/notes?limit=abc").status_code == 400
+    assert len(client.get("/notes?limit=0").json["notes"]) == 1
+
+
+def test_notes_are_listed_with_their_current_size(client, storage):
+    # an old directory mtime keeps the catalog from rescanning it
+    os.utime(storage.root_path, ns=(0, 0))
+    assert client.get("/notes?prefix=car").json["notes"][0]["size"] != len("Cars.")
+    with open(storage.note_abs_path("car.txt"), "w") as f:
+        f.write("Cars.")
+    notes = client.get("/notes?prefix=car").json["notes"]
+    assert notes[0]["path"] == "car.txt"
+    assert notes[0]["size"] == len("Cars.")
+
+
+def test_index_renders_the_first_page(client, monkeypatch):
+    monkeypatch.setattr(server, "NOTES_PAGE_SIZE", 3)
+    page = client.get("/").get_data(as_text=True)
+    assert "animals/cat.txt" in page
+    assert "car.txt" in page
+    assert "countries/canada.txt" not in page
+    assert 'data-cursor="car.txt"' in page
+
+
+def test_summary_jobs_are_read_by_key(client):
+    summary = client.post("/text-summary", json={"text": "A note about owls."})
+    assert summary.status_code == 200
+    key = server.summarizer._get_key("A note about owls.")
+    job = client.get(f"/summary-job/{key}")
+    assert job.status_code == 200
+    assert job.get_data(as_text=True) == summary.get_data(as_text=True)
+    assert client.get("/summary-job/unknown").status_code == 404
+
+
+def test_note_summary_streams_server_sent_events(client):
+    response = client.get("/note-summary-stream/car.txt")
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    events = response.get_data(as_text=True).split("\n\n")
+    assert events[-2:] == ["event: done\ndata: ", ""]
+    pieces = [json.loads(event[len("data: ") :]) for event in events[:-2]]
+    summary = client.get("/note-summary/car.txt").get_data(as_text=True)
+    assert "".join(pieces) == summary
+    assert client.get("/note-summary-stream/missing.txt").status_code == 404
@@ -0,0 +1,117 @@
+import os
+
+from noter_gpt import catalog
+from noter_gpt.manifest import NoteManifest, hash_text
+
+
+def _age(path, seconds=60):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - seconds * 10**9))
+
+
+def test_manifest_hashes_notes(storage):
+    with open(storage.note_abs_path("car.txt"), "r", encoding="utf-8") as f:
+        text = f.read()
+    assert storage.manifest.hash("car.txt") == hash_text(text)
+    assert storage.manifest.hash("missing.txt") is None
+
+
+def test_manifest_hash_and_mtime(storage):
+    path = storage.note_abs_path("car.txt")
+    _age(path)
+    doc_hash, mtime_ns = storage.manifest.hash_and_mtime("car.txt")
+    assert doc_hash == storage.manifest.hash("car.txt")
+    assert mtime_ns == os.stat(path).st_mtime_ns
+    assert storage.manifest.hash_and_mtime("missing.txt") is None
+
+
+def test_manifest_skips_reads_for_unchanged_stat(storage):
+    path = storage.note_abs_path("car.txt")
+    _age(path)
+    original_hash = storage.manifest.hash("car.txt")
+
+    # same size and mtime: the manifest must trust its recorded hash
+    stat = os.stat(path)
+    with open(path, "r+", encoding="utf-8") as f:
+        f.write("X")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert storage.manifest.hash("car.txt") == original_hash
+
+    _age(path, seconds=120)
+    assert storage.manifest.hash("car.txt") != original_hash
+
+
+def test_manifest_persists(storage):
+    _age(storage.note_abs_path("car.txt"))
+    doc_hash = storage.manifest.hash("car.txt")
+    storage.manifest.save()
+
+    reloaded = NoteManifest(storage.note_manifest_file(), storage.root_path)
+    assert reloaded.entries["car.txt"][3] == doc_hash
+
+    reloaded.prune(["plane.txt"])
+    assert "car.txt" not in reloaded.entries
+
+
+def test_catalog_lists_notes_like_a_walk(storage):
+    os.makedirs(storage.note_abs_path(".hidden"))
+    with open(storage.note_abs_path(".hidden/secret.txt"), "w") as f:
+        f.write("not a note")
+    walked = []
+    for root, dirs, names in os.walk(storage.root_path):
+        dirs[:] = [d for d in dirs if not catalog.is_hidden(d)]
+        walked += [
+            os.path.relpath(os.path.join(root, name), storage.root_path)
+            for name in names
+            if catalog.is_note(name)
+        ]
+    walked.sort()
+    assert storage.all_notes() == walked
+    assert ".hidden/secret.txt" not in walked
+    assert storage.catalog.info()["car.txt"].size == os.path.getsize(
+        storage.note_abs_path("car.txt")
+    )
+
+
+def test_catalog_only_rescans_changed_directories(storage, monkeypatch):
+    for root, _, _ in os.walk(storage.root_path):
+        _age(root)
+    notes = storage.all_notes()
+
+    scanned = []
+    scandir = os.scandir
+
+    def counting_scandir(path):
+        scanned.append(os.path.relpath(path, storage.root_path))
+        return scandir(path)
+
+    monkeypatch.setattr(catalog.os, "scandir", counting_scandir)
+    assert storage.all_notes() == notes
+    assert scanned == []
+
+    os.makedirs(storage.note_abs_path("birds"))
+    with open(storage.note_abs_path("birds/owl.txt"), "w") as f:
+        f.write("Owls hunt at night.")
+    os.remove(storage.note_abs_path("animals/dog.txt"))
+    _age(storage.note_abs_path("birds"))
+    expected = sorted(set(notes) - {"animals/dog.txt"} | {"birds/owl.txt"})
+    assert storage.all_notes() == expected
+    assert sorted(scanned) == [".", "animals", "birds"]
+
+
+def test_catalog_pages_through_notes(storage):
+    notes = storage.all_notes()
+    pages = []
+    cursor = None
+    while True:
+        page, has_more = storage.catalog.page(after=cursor, limit=3)
+        pages.append([note for note, _ in page])
+        if not has_more:
+            break
+        cursor = page[-1][0]
+    assert [note for page in pages for note in page] == notes
+    assert all(len(page) == 3 for page in pages[:-1])
+
+    page, has_more = storage.catalog.page(prefix="websites/", limit=10)
+    assert [note for note, _ in page] == [n for n in notes if n.startswith("websites/")]
+    assert not has_more
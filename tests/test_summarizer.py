@@ -1,6 +1,48 @@
+import json
+import time
+import asyncio
+import threading
+from multiprocessing.pool import ThreadPool
+
 import pytest
+from transformers import TextIteratorStreamer
 from noter_gpt.summarizer.bart_summarizer import BartSummarizer
+from noter_gpt.summarizer.cache import SummaryCache
+from noter_gpt.summarizer.chunked_summarizer import ChunkedSummarizer
+from noter_gpt.summarizer.job_queue import SummaryJobQueue
 from noter_gpt.summarizer.openai_summarizer import OpenAISummarizer
+from noter_gpt.summarizer.process_pool_summarizer import ProcessPoolSummarizer
+from noter_gpt.summarizer.token_bucket import TokenBucket
+from noter_gpt.summarizer.util import stream_generation
+
+
+class FirstWordsSummarizer(ChunkedSummarizer):
+    """Keeps the first words of every chunk and records what it summarized"""
+
+    max_summary_words = 20
+
+    def __init__(self, storage):
+        super().__init__(storage=storage)
+        self.summarized = []
+        self.batches = []
+
+    def _chunk_size(self) -> int:
+        return 100
+
+    def _summarize_chunk(self, chunk: str) -> str:
+        self.summarized.append(chunk)
+        return " ".join(chunk.split()[:4])
+
+    def _summarize_chunks(self, chunks):
+        self.batches.append(len(chunks))
+        return super()._summarize_chunks(chunks)
+
+    def _cache_model_key(self) -> str:
+        return "FIRST_WORDS"
+
+
+def first_words_summarizer(storage):
+    return FirstWordsSummarizer(storage)
 
 
 def test_local_summarizer(shared_datadir):
@@ -39,3 +81,249 @@ def test_openai_summarizer_cache(shared_datadir):
     summary1 = summarizer.summarize_file(file_path)
     summary2 = summarizer.summarize_file(file_path)
     assert summary1 == summary2
+
+
+def test_summary_cache_is_shared_by_threads_and_persisted(tmp_path):
+    json_file = tmp_path / "file_summaries.json"
+    json_file.write_text(json.dumps({"old": "old summary"}))
+    database_file = str(tmp_path / "summaries.sqlite3")
+    cache = SummaryCache(database_file, legacy_json_file=str(json_file))
+
+    with ThreadPool(8) as pool:
+        pool.map(lambda i: cache.put(f"key{i}", f"summary {i}"), range(100))
+    assert cache.get("key7") == "summary 7"
+    cache.close()
+
+    reopened = SummaryCache(database_file, legacy_json_file=str(json_file))
+    assert len(reopened) == 101
+    assert reopened.get("old") == "old summary"
+    assert reopened.get("key99") == "summary 99"
+    assert reopened.get("missing") is None
+
+
+def test_summary_cache_evicts_least_recently_used(tmp_path):
+    cache = SummaryCache(str(tmp_path / "summaries.sqlite3"), memory_budget_bytes=20)
+    cache.put("a", "a" * 8)
+    cache.put("b", "b" * 8)
+    assert cache.get("a") == "a" * 8  # a is now used more recently than b
+    cache.put("c", "c" * 8)
+    assert list(cache.front) == ["a", "c"]
+
+    assert cache.get("b") == "b" * 8  # still in the database
+    assert cache.get("missing") is None
+    stats = cache.statistics()
+    assert stats["process"] == {
+        "hits": 2,
+        "misses": 1,
+        "evictions": 2,
+        "bytes_saved": 16,
+    }
+    assert stats["total"] == stats["process"]
+    assert stats["size"]["entries"] == 3
+
+
+def test_chunked_summarizer_only_resummarizes_changed_chunks(storage):
+    summarizer = FirstWordsSummarizer(storage)
+    paragraphs = [
+        f"Paragraph {i} talks about topic {i} at some length." for i in range(12)
+    ]
+    summarizer.summarize_text("\n\n".join(paragraphs))
+    first_run = len(summarizer.summarized)
+
+    summarizer.summarized = []
+    paragraphs[5] = "Paragraph 5 now talks about something else entirely."
+    summarizer.summarize_text("\n\n".join(paragraphs))
+    assert 0 < len(summarizer.summarized) < first_run
+    assert sum("something else" in chunk for chunk in summarizer.summarized) == 1
+
+
+def test_chunked_summarizer_batches_chunks_of_many_texts(storage):
+    summarizer = FirstWordsSummarizer(storage)
+    texts = [
+        "\n\n".join(f"Note {n} paragraph {i} says something." for i in range(6))
+        for n in range(4)
+    ]
+    summaries = summarizer.summarize_texts(texts)
+    assert max(summarizer.batches) == summarizer.batch_size
+    assert len(summarizer.batches) < len(summarizer.summarized)
+    assert summaries == [summarizer.summarize_text(text) for text in texts]
+
+
+def test_process_pool_summarizer_fills_cache(storage):
+    ProcessPoolSummarizer(
+        storage=storage, summarizer_factory=first_words_summarizer, processes=2
+    ).summarize_all_notes()
+
+    summarizer = FirstWordsSummarizer(storage)
+    for note in storage.all_notes():
+        summarizer.summarize_file(note)
+    assert summarizer.summarized == []
+
+
+def test_openai_summarizer_retries_concurrent_requests(openai_stub, storage):
+    summarizer = OpenAISummarizer(
+        storage=storage,
+        api_key="test",
+        base_url=openai_stub["base_url"],
+        concurrent_requests=4,
+        initial_backoff_seconds=0.01,
+    )
+    texts = [f"Note number {i}. " * (i + 1) for i in range(10)]
+    summaries = summarizer.summarize_texts(texts)
+    assert len(summaries) == len(texts)
+    assert all(summary.startswith("summary of") for summary in summaries)
+    # every third request is rate limited and retried
+    assert len(openai_stub["requests"]) > len(texts)
+
+    requests_made = len(openai_stub["requests"])
+    assert summarizer.summarize_texts(texts) == summaries
+    assert len(openai_stub["requests"]) == requests_made  # served from the cache
+
+
+def test_openai_summarizer_keeps_summaries_when_a_note_fails(openai_stub, storage):
+    summarizer = OpenAISummarizer(
+        storage=storage,
+        api_key="test",
+        base_url=openai_stub["base_url"],
+        initial_backoff_seconds=0.01,
+    )
+    texts = ["A fine note.", "A BAD REQUEST note.", "Another fine note."]
+    summaries = summarizer.summarize_texts(texts)
+    assert summaries[1] is None
+    assert summaries[0].startswith("summary of")
+    assert summaries[2].startswith("summary of")
+
+    # only the failed note is sent again
+    requests_made = len(openai_stub["requests"])
+    assert summarizer.summarize_texts(texts) == summaries
+    prompts = [r["messages"][-1]["content"] for r in openai_stub["requests"]]
+    assert all("BAD REQUEST" in prompt for prompt in prompts[requests_made:])
+
+
+def test_openai_summarizer_caches_each_summary_as_it_finishes(openai_stub, storage):
+    summarizer = OpenAISummarizer(
+        storage=storage,
+        api_key="test",
+        base_url=openai_stub["base_url"],
+        initial_backoff_seconds=0.01,
+    )
+    texts = ["A fine note.", "A BAD REQUEST note.", "Another fine note."]
+    summaries = summarizer._summarize_all(texts)
+    cached = [summarizer._get_from_cache(summarizer._get_key(text)) for text in texts]
+    assert cached == summaries
+    assert cached[1] is None
+
+
+def test_token_bucket_limits_rate():
+    async def acquire_all():
+        bucket = TokenBucket(rate=50, capacity=5)
+        for _ in range(15):
+            await bucket.acquire()
+
+    start = time.monotonic()
+    asyncio.run(acquire_all())
+    # a burst of 5, then 10 more at 50 per second
+    assert time.monotonic() - start >= 0.18
+
+
+def test_token_bucket_charges_amounts_larger_than_capacity():
+    async def acquire_all():
+        bucket = TokenBucket(rate=1000, capacity=10)
+        for _ in range(5):
+            await bucket.acquire(50)
+
+    start = time.monotonic()
+    asyncio.run(acquire_all())
+    # each acquire after the first waits for its full 50, not only for the 10
+    # the bucket holds
+    assert time.monotonic() - start >= 0.19
+
+
+def test_openai_summarizer_streams_and_caches(openai_stub, storage):
+    summarizer = OpenAISummarizer(
+        storage=storage,
+        api_key="test",
+        base_url=openai_stub["base_url"],
+        initial_backoff_seconds=0.01,
+    )
+    pieces = list(summarizer.stream_summarize_text("Some text to summarize."))
+    assert len(pieces) == 3
+    assert summarizer.summarize_text("Some text to summarize.") == "".join(pieces)
+
+
+def test_chunked_summarizer_streams_same_summary(storage):
+    paragraphs = [
+        f"Paragraph {i} talks about topic {i} at some length." for i in range(12)
+    ]
+    text = "\n\n".join(paragraphs)
+    streamed = "".join(FirstWordsSummarizer(storage).stream_summarize_text(text))
+    assert FirstWordsSummarizer(storage).summarize_text(text) == streamed
+
+    # a single chunk is streamed straight from the model
+    text = "A short note. It fits in one chunk."
+    streamed = "".join(FirstWordsSummarizer(storage).stream_summarize_text(text))
+    assert streamed == "A short note. It"
+    assert FirstWordsSummarizer(storage).summarize_text(text) == streamed
+
+
+def test_summary_jobs_run_once_per_text(storage):
+    summarizer = FirstWordsSummarizer(storage)
+    release = threading.Event()
+    summarize_chunk = summarizer._summarize_chunk
+
+    def gated_summarize_chunk(chunk):
+        release.wait()
+        return summarize_chunk(chunk)
+
+    summarizer._summarize_chunk = gated_summarize_chunk
+    jobs = SummaryJobQueue(summarizer, workers=2)
+    texts = ["A short note about cats.", "A short note about dogs."] * 5
+    with ThreadPool(10) as pool:
+        submitted = pool.map(jobs.submit, texts)
+    assert not any(job.wait(0.1) for job in submitted)
+    assert len({id(job) for job in submitted}) == 2
+
+    release.set()
+    assert all(job.wait(5) for job in submitted)
+    assert len(summarizer.summarized) == 2
+    assert [job.summary() for job in submitted[:2]] == [
+        "A short note about",
+        "A short note about",
+    ]
+    # finished summaries come from the cache without running the model again
+    assert "".join(jobs.submit(texts[0]).stream()) == "A short note about"
+    assert jobs.get(submitted[1].key).summary() == "A short note about"
+    assert len(summarizer.summarized) == 2
+    jobs.shutdown()
+
+
+def test_failed_generation_ends_the_stream(storage):
+    def generate(streamer):
+        raise RuntimeError("out of memory")
+
+    class FailingSummarizer(FirstWordsSummarizer):
+        def _stream_summarize_chunk(self, chunk):
+            return stream_generation(TextIteratorStreamer(None), generate)
+
+    summarizer = FailingSummarizer(storage)
+    with pytest.raises(RuntimeError, match="out of memory"):
+        list(summarizer.stream_summarize_text("A short note about cats."))
+
+    # the single worker is free again for the next job
+    jobs = SummaryJobQueue(summarizer, workers=1)
+    failed = jobs.submit("A short note about cats.")
+    assert failed.wait(5) and isinstance(failed.error, RuntimeError)
+    summarizer._stream_summarize_chunk = lambda chunk: iter(["fine"])
+    assert "".join(jobs.submit("A short note about dogs.").stream()) == "fine"
+    jobs.shutdown()
+
+
+def test_summary_jobs_count_one_miss_per_uncached_text(storage):
+    summarizer = FirstWordsSummarizer(storage)
+    list(summarizer.stream_summarize_text("A short note about cats."))
+    misses = summarizer.cache.stats["misses"]
+
+    jobs = SummaryJobQueue(summarizer)
+    assert jobs.submit("A short note about dogs.").wait(5)
+    assert summarizer.cache.stats["misses"] == 2 * misses
+    jobs.shutdown()
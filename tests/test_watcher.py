@@ -0,0 +1,44 @@
+import os
+import pytest
+from noter_gpt.watcher.inotify_watcher import InotifyWatcher
+from noter_gpt.watcher.polling_watcher import PollingWatcher
+
+
+@pytest.fixture(params=[InotifyWatcher, PollingWatcher])
+def watcher(request, storage):
+    watcher = request.param(storage)
+    if not watcher.is_available():
+        pytest.skip(f"{request.param.__name__} is not available")
+    if isinstance(watcher, PollingWatcher):
+        watcher.interval = 0.01
+    watcher.changes()  # start watching
+    yield watcher
+    watcher.close()
+
+
+def collect_changes(watcher):
+    changes = set()
+    for _ in range(3):
+        changes.update(watcher.changes() or [])
+    return sorted(changes)
+
+
+def test_reports_changed_notes(watcher, storage):
+    with open(storage.note_abs_path("car.txt"), "a") as f:
+        f.write("\nCars have wheels.")
+    with open(storage.note_abs_path("countries/germany.txt"), "w") as f:
+        f.write("Germany is a country in Europe.")
+    os.remove(storage.note_abs_path("plane.txt"))
+    assert collect_changes(watcher) == [
+        "car.txt",
+        "countries/germany.txt",
+        "plane.txt",
+    ]
+
+
+def test_ignores_hidden_files(watcher, storage):
+    with open(storage.note_abs_path(".hidden.txt"), "w") as f:
+        f.write("hidden")
+    with open(storage.note_abs_path("not_a_note.md"), "w") as f:
+        f.write("not a note")
+    assert collect_changes(watcher) == []